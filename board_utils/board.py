@@ -2,20 +2,32 @@
 
 """
 
-import numpy as np
+from card_utils.cards import decode_hand
 
 
 class Board:
 
+    __slots__ = ('cards', 'mask')
+
     def __init__(self):
 
-        self.current_board = {
-            'cards': [],
-            'suits': []
-        }
+        # Card codes in the order they were dealt, plus the same cards as a bitmask
+        self.cards = []
+        self.mask = 0
+
+    @property
+    def current_board(self):
+        """The board in the {'cards': [...], 'suits': [...]} dictionary format"""
+        return decode_hand(self.cards)
+
+    def add_card(self, card):
+        """"""
+
+        self.cards.append(card)
+        self.mask |= 1 << card
 
-    def add_card(self, suit, card):
+    def clear(self):
         """"""
 
-        self.current_board['suits'].append(suit)
-        self.current_board['cards'].append(card)
+        self.cards = []
+        self.mask = 0
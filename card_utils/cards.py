@@ -0,0 +1,202 @@
+"""
+Compact card encoding shared by the deck, the board, the game and the engine.
+
+Every card is an integer code in [0, 51] laid out as `suit * 13 + rank`, where
+rank 0 is a deuce and rank 12 is an ace. A set of cards is a 64-bit mask with
+bit `code` set for each card in it. The `{'cards': [...], 'suits': [...]}`
+dictionaries are only used at the edges, through the conversion helpers below.
+"""
+
+import numpy as np
+
+SUITS = ['d', 'h', 's', 'c']
+RANKS = [2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K', 'A']
+
+# Single-character rank names, used when reading and writing cards as text
+RANK_CHARS = '23456789TJQKA'
+
+# The 1326 two-card holdings (low card first) in a fixed order, as card pairs
+# and as bitmasks, and the index of each holding from either card order
+COMBOS = np.array([(a, b) for a in range(52) for b in range(a + 1, 52)], dtype=np.int64)
+COMBO_MASKS = (np.int64(1) << COMBOS[:, 0]) | (np.int64(1) << COMBOS[:, 1])
+COMBO_INDEX = np.zeros((52, 52), dtype=np.int64)
+COMBO_INDEX[COMBOS[:, 0], COMBOS[:, 1]] = np.arange(len(COMBOS))
+COMBO_INDEX[COMBOS[:, 1], COMBOS[:, 0]] = np.arange(len(COMBOS))
+
+# Number of cards in every 13-bit rank mask
+POPCOUNT = np.array([bin(m).count('1') for m in range(8192)], dtype=np.int64)
+
+# Number of board cards visible on each street, preflop to river
+VISIBLE_BOARD = np.array([0, 3, 4, 5])
+
+# Rows dealt or evaluated per vectorized block
+BATCH_BLOCK = 1 << 16
+
+# Boards per InterpreterEngine.rank_holdings call, which ranks 1326 holdings on each
+RUNOUT_BLOCK = 256
+
+_SUIT_INDEX = {s: i for i, s in enumerate(SUITS)}
+_RANK_INDEX = {r: i for i, r in enumerate(RANKS)}
+_RANK_INDEX.update({str(r): i for i, r in enumerate(RANKS)})
+_RANK_INDEX.update({c: i for i, c in enumerate(RANK_CHARS)})
+
+
+def encode_card(suit, card):
+    """Translates a (suit, card) pair such as ('s', 'A') into its card code"""
+    return _SUIT_INDEX[suit] * 13 + _RANK_INDEX[card]
+
+
+def decode_card(code):
+    """Translates a card code back into its (suit, card) pair"""
+    return SUITS[code // 13], RANKS[code % 13]
+
+
+def card_rank(code):
+    """Rank of a card code, 0 (deuce) through 12 (ace)"""
+    return code % 13
+
+
+def card_suit(code):
+    """Suit index of a card code, following the order of SUITS"""
+    return code // 13
+
+
+def encode_hand(hand):
+    """Translates a hand or board dictionary into a list of card codes
+
+    Args:
+        hand (dict): {'cards': [...], 'suits': [...]}
+
+    Returns:
+        list of card codes
+    """
+
+    return [
+        encode_card(suit=suit, card=card)
+        for card, suit in zip(hand['cards'], hand['suits'])
+    ]
+
+
+def decode_hand(cards):
+    """Translates a list of card codes into a hand or board dictionary
+
+    Args:
+        cards (iterable): card codes
+
+    Returns:
+        {'cards': [...], 'suits': [...]}
+    """
+
+    hand = {
+        'cards': [],
+        'suits': []
+    }
+
+    for code in cards:
+        suit, card = decode_card(code)
+        hand['cards'].append(card)
+        hand['suits'].append(suit)
+
+    return hand
+
+
+def cards_to_mask(cards):
+    """Folds a list of card codes into a bitmask"""
+
+    mask = 0
+    for code in cards:
+        mask |= 1 << int(code)
+
+    return mask
+
+
+def cards_to_masks(cards):
+    """Vectorized cards_to_mask, folding the last axis of an array of card codes
+
+    Args:
+        cards (np.ndarray): card codes of shape (..., k)
+
+    Returns:
+        np.ndarray of int64 bitmasks with shape (...)
+    """
+
+    return np.bitwise_or.reduce(np.left_shift(np.int64(1), np.asarray(cards, dtype=np.int64)), axis=-1)
+
+
+def subset_masks(cards, k):
+    """Every k-card subset of the given cards as a bitmask
+
+    The subsets are built one card at a time: each partial subset of size j is
+    extended by every card after its last one, so no subset is generated twice.
+
+    Args:
+        cards (iterable): card codes
+        k (int): subset size
+
+    Returns:
+        np.ndarray of int64 bitmasks in lexicographic order
+    """
+
+    cards = np.sort(np.asarray(list(cards), dtype=np.int64))
+    bits = np.left_shift(np.int64(1), cards)
+    n = len(cards)
+
+    masks = np.zeros(1 if k <= n else 0, dtype=np.int64)
+    last = np.full(len(masks), -1, dtype=np.int64)
+
+    for j in range(k):
+        # Only cards that still leave room for the rest of the subset
+        n_next = np.maximum(n - (k - j - 1) - (last + 1), 0)
+        parent = np.repeat(np.arange(len(masks)), n_next)
+        offsets = np.arange(len(parent)) - np.repeat(np.cumsum(n_next) - n_next, n_next)
+
+        last = last[parent] + 1 + offsets
+        masks = masks[parent] | bits[last]
+
+    return masks
+
+
+def mask_to_cards(mask):
+    """Unfolds a bitmask back into an ascending list of card codes"""
+
+    cards = []
+    while mask:
+        low = mask & -mask
+        cards.append(low.bit_length() - 1)
+        mask ^= low
+
+    return cards
+
+
+def parse_cards(text):
+    """Reads cards written as text, e.g. 'AsKd' or 'As Kd', into card codes"""
+
+    text = text.replace(' ', '').replace(',', '')
+    return [
+        _SUIT_INDEX[text[i + 1].lower()] * 13 + _RANK_INDEX[text[i].upper()]
+        for i in range(0, len(text), 2)
+    ]
+
+
+def format_cards(cards):
+    """Writes card codes as text, e.g. [51, 37] -> 'AcKs'"""
+    return ''.join(RANK_CHARS[code % 13] + SUITS[code // 13] for code in cards)
+
+
+def to_mask(cards):
+    """Accepts any of the supported card formats and returns a bitmask
+
+    Args:
+        cards: a bitmask, an iterable of card codes or a hand dictionary
+
+    Returns:
+        the bitmask of the cards
+    """
+
+    if isinstance(cards, dict):
+        return cards_to_mask(encode_hand(cards))
+
+    if hasattr(cards, '__iter__'):
+        return cards_to_mask(cards)
+
+    return int(cards)
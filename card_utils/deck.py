@@ -3,48 +3,190 @@
 """
 
 import numpy as np
-import copy
+
+from card_utils.cards import BATCH_BLOCK, mask_to_cards, to_mask
 
 
 class Deck:
 
-    def __init__(self):
+    __slots__ = ('rng', 'cards', '_position', '_uniforms', 'n_dealt')
+
+    # Length of a snapshot: the number of dealt cards, the card order and the
+    # uniform draws of the current shuffle
+    SNAPSHOT_SIZE = 1 + 52 + 52
+
+    def __init__(self, seed=None):
+        """A 52-card deck backed by one preallocated array of card codes
+
+        The cards at positions [0, n_dealt) have been dealt and the rest are
+        still in the deck. Every draw is one step of a Fisher-Yates shuffle: a
+        uniformly random remaining card is swapped to the front of the undealt
+        section. Nothing is reordered or copied when the deck is reset.
+
+        Args:
+            seed: seed (or numpy Generator) for this deck's random stream
+        """
+
+        self.rng = np.random.default_rng(seed)
 
-        self.all_cards = {
-            'd': [2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K', 'A'],
-            'h': [2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K', 'A'],
-            's': [2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K', 'A'],
-            'c': [2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K', 'A']
-        }
+        # Every card is a code in [0, 51], see card_utils.cards
+        self.cards = list(range(52))
 
-        self.current_cards = None
+        # Inverse of self.cards, i.e. the array position of each card code
+        self._position = list(range(52))
 
-        self._create()
+        # One uniform draw per array position, refilled in place on each shuffle
+        self._uniforms = np.empty(52)
 
+        self.n_dealt = 0
 
-    def _create(self):
-        """"""
+        self.shuffle()
 
-        self.current_cards = copy.deepcopy(self.all_cards)
+    @property
+    def current_cards(self):
+        """The card codes that are still in the deck"""
+        return self.cards[self.n_dealt:]
+
+    @property
+    def remaining(self):
+        """Number of cards still in the deck"""
+        return 52 - self.n_dealt
 
     def draw_card(self):
-        """"""
+        """Draws one card, uniformly at random, from the remaining cards
+
+        Returns:
+            the card code that was drawn
+        """
+
+        i = self.n_dealt
+        if i == 52:
+            raise ValueError('Cannot draw from an empty deck.')
 
-        # Selecting the suit and the card number
-        suit = np.random.choice(list(self.current_cards.keys()))
-        card = np.random.choice(self.current_cards[suit])
+        j = i + int(self._uniforms[i] * (52 - i))
+        self._swap(i, j)
+        self.n_dealt = i + 1
 
-        # For whatever reason, using the above functions make the selections into strings...
-        try:
-            card = int(card)
-        except:
-            pass
+        return self.cards[i]
 
-        # Now we need to remove the chosen card from the current deck
-        self.current_cards[suit].remove(card)
+    def remove_card(self, card):
+        """Takes a known card out of the deck, e.g. a card that is already
+        in someone's hand
 
-        return suit, card
+        Args:
+            card (int): the card code to remove
+        """
+
+        j = self._position[card]
+        if j < self.n_dealt:
+            raise ValueError('Card has already been dealt.')
+
+        self._swap(self.n_dealt, j)
+        self.n_dealt += 1
 
     def shuffle(self):
-        """"""
-        self.current_cards = copy.deepcopy(self.all_cards)
+        """Returns every card to the deck and redraws the random stream"""
+
+        self.n_dealt = 0
+        self.rng.random(out=self._uniforms)
+
+    def snapshot(self, out=None):
+        """Writes the deck order and draw position into a flat int64 array
+
+        The uniforms of the current shuffle are stored bit for bit, so after a
+        restore the following draws produce the same cards as they would have
+        from the snapshot. The random generator itself is not part of it.
+
+        Args:
+            out (np.ndarray): optional int64 array of length SNAPSHOT_SIZE to fill
+
+        Returns:
+            the filled array
+        """
+
+        if out is None:
+            out = np.empty(self.SNAPSHOT_SIZE, dtype=np.int64)
+
+        out[0] = self.n_dealt
+        out[1:53] = self.cards
+        out[53:105] = self._uniforms.view(np.int64)
+
+        return out
+
+    def restore(self, state):
+        """Puts the deck back to a snapshot taken with snapshot()"""
+
+        self.n_dealt = int(state[0])
+        self.cards[:] = state[1:53].tolist()
+        for i, card in enumerate(self.cards):
+            self._position[card] = i
+        self._uniforms[:] = state[53:105].view(np.float64)
+
+    def deal_many(self, n_deals, n_players, board_len=5, dead_cards=None, out=None):
+        """Generates whole batches of deals at once
+
+        Each row is an independent deal from a fresh deck (minus the dead cards),
+        so the deck's own draw state is left untouched. The rows are produced by
+        running the Fisher-Yates steps column by column over a block of decks at
+        a time, which keeps the per-card Python overhead out of the loop.
+
+        Args:
+            n_deals (int): number of deals (rows)
+            n_players (int): number of players receiving two hole cards each
+            board_len (int): number of board cards per deal
+            dead_cards: card codes, bitmask or dictionary of cards that must not be dealt
+            out (np.ndarray): optional (n_deals, 2 * n_players + board_len) array to fill
+
+        Returns:
+            np.ndarray of card codes with shape (n_deals, 2 * n_players + board_len).
+            Player i holds columns 2i and 2i + 1 and the board is the last board_len columns
+        """
+
+        live = np.arange(52, dtype=np.int8)
+        if dead_cards is not None:
+            live = np.delete(live, mask_to_cards(to_mask(dead_cards)))
+
+        slots = 2 * n_players + board_len
+        n_live = len(live)
+        if slots > n_live:
+            raise ValueError('Not enough live cards for {} players and {} board cards.'.format(n_players, board_len))
+
+        if out is None:
+            out = np.empty((n_deals, slots), dtype=np.int8)
+
+        perm = np.empty((min(BATCH_BLOCK, n_deals), n_live), dtype=np.int8)
+        row_starts = np.arange(len(perm)) * n_live
+        spans = n_live - np.arange(slots)
+
+        for start in range(0, n_deals, BATCH_BLOCK):
+            m = min(BATCH_BLOCK, n_deals - start)
+            p = perm[:m]
+            p[:] = live
+            flat = p.reshape(-1)
+
+            # Uniform offsets into the undealt part of each deck, one column per slot,
+            # stored as positions in the flattened block
+            offsets = (self.rng.random((slots, m)) * spans[:, None]).astype(np.intp)
+            offsets += np.arange(slots)[:, None]
+            offsets += row_starts[:m]
+
+            for k in range(slots):
+                j = offsets[k]
+                chosen = flat[j]
+                flat[j] = p[:, k]
+                p[:, k] = chosen
+
+            out[start:start + m] = p[:, :slots]
+
+        return out
+
+    def _swap(self, i, j):
+        """Swaps the cards at array positions i and j"""
+
+        cards = self.cards
+        a = cards[j]
+        b = cards[i]
+        cards[i] = a
+        cards[j] = b
+        self._position[a] = i
+        self._position[b] = j
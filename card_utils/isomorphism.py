@@ -0,0 +1,323 @@
+"""
+Suit-isomorphism canonicalization of hands and boards.
+
+Two deals that only differ by a relabeling of the suits are strategically
+identical, e.g. AsKs on 2s7h9d and AhKh on 2h7s9d. A HandIndexer maps every deal
+onto a canonical representative and onto a dense index in [0, size), so the
+index can be used as a cache key or as the row of a precomputed table.
+
+A deal is split into rounds, e.g. (2, 3) is two hole cards plus a flop. The
+indexing follows Waugh's hand isomorphism scheme:
+    (1) Within one suit, the ranks dealt in each round are indexed as a
+        combination of the ranks not used by earlier rounds
+    (2) Each suit's configuration is the number of its cards in every round.
+        Suits are sorted by configuration, and suits that share a configuration
+        are interchangeable, so their indices are combined as a multiset
+    (3) The hand index is the offset of the sorted configuration plus the
+        mixed-radix combination of the per-configuration multiset indices
+"""
+
+from bisect import bisect_right
+from itertools import product
+from math import comb
+
+from card_utils.cards import POPCOUNT
+
+# Plain list for the per-card Python loops
+_POPCOUNT = POPCOUNT.tolist()
+
+# Binomial coefficients over the 13 ranks, _COMB[n][k]
+_COMB = [[comb(n, k) for k in range(14)] for n in range(14)]
+
+
+class HandIndexer:
+
+    def __init__(self, rounds):
+        """Prepares the configuration tables of a round structure
+
+        Args:
+            rounds (tuple): number of cards dealt in each round, e.g. (2, 3, 1, 1)
+        """
+
+        self.rounds = tuple(rounds)
+        self.n_cards = sum(self.rounds)
+
+        # (0) Every way a single suit can take part in each round
+        suit_configs = [
+            c for c in product(*[range(n + 1) for n in self.rounds])
+            if sum(c) <= 13
+        ]
+
+        self._suit_size = {}
+        for c in suit_configs:
+            size = 1
+            used = 0
+            for k in c:
+                size *= _COMB[13 - used][k]
+                used += k
+            self._suit_size[c] = size
+
+        # (1) Every way the rounds can be split over the 4 suits, with the suits
+        # sorted so that suit relabelings collapse onto one configuration
+        # The last suit takes whatever the first three leave over
+        hand_configs = set()
+        for combo in product(suit_configs, repeat=3):
+            last = tuple(n - sum(c[i] for c in combo) for i, n in enumerate(self.rounds))
+            if last in self._suit_size:
+                hand_configs.add(tuple(sorted(combo + (last,), reverse=True)))
+        self.configs = sorted(hand_configs, reverse=True)
+        self._config_id = {c: i for i, c in enumerate(self.configs)}
+
+        # (2) Number of canonical hands in each configuration and their offsets
+        self._groups = []
+        self.offsets = []
+        total = 0
+        for config in self.configs:
+            groups = []
+            start = 0
+            while start < 4:
+                end = start
+                while end < 4 and config[end] == config[start]:
+                    end += 1
+                m = self._suit_size[config[start]]
+                groups.append((start, end, m, comb(m + end - start - 1, end - start)))
+                start = end
+
+            size = 1
+            for g in groups:
+                size *= g[3]
+
+            self._groups.append(groups)
+            self.offsets.append(total)
+            total += size
+
+        self.size = total
+
+    def index(self, cards):
+        """Dense index of the canonical form of a deal
+
+        Args:
+            cards (list): card codes, in the order of the rounds
+
+        Returns:
+            the index, in [0, size)
+        """
+
+        return self._index_and_order(cards=cards)[0]
+
+    def canonicalize(self, cards):
+        """Canonical form of a deal together with its index
+
+        Suits are relabeled in canonical order and the cards within each round
+        are sorted, so every deal in the same isomorphism class gives the same list.
+
+        Args:
+            cards (list): card codes, in the order of the rounds
+
+        Returns:
+            the canonical card codes and the index
+        """
+
+        idx, order, masks = self._index_and_order(cards=cards)
+        relabel = {suit: new for new, suit in enumerate(order)}
+
+        canonical = []
+        for i in range(len(self.rounds)):
+            canonical += sorted(
+                relabel[s] * 13 + r
+                for s in range(4)
+                for r in range(13) if masks[s][i] >> r & 1
+            )
+
+        return canonical, idx
+
+    def unindex(self, idx):
+        """Canonical representative of an index
+
+        Args:
+            idx (int): an index in [0, size)
+
+        Returns:
+            the canonical card codes, in the order of the rounds
+        """
+
+        if not 0 <= idx < self.size:
+            raise ValueError('Index {} is out of range for {} hands.'.format(idx, self.size))
+
+        config_id = bisect_right(self.offsets, idx) - 1
+        config = self.configs[config_id]
+        remainder = idx - self.offsets[config_id]
+
+        # Peeling the group multisets off from the least significant end
+        suit_indexes = [0] * 4
+        for start, end, m, count in reversed(self._groups[config_id]):
+            remainder, group_idx = divmod(remainder, count)
+            xs = self._multiset_unrank(idx=group_idx, k=end - start)
+            # Within a group, canonical order puts the larger suit index first
+            for position, x in zip(range(start, end), reversed(xs)):
+                suit_indexes[position] = x
+
+        canonical = [[] for _ in self.rounds]
+        for suit in range(4):
+            for i, mask in enumerate(self._suit_unindex(idx=suit_indexes[suit], config=config[suit])):
+                canonical[i] += [suit * 13 + r for r in range(13) if mask >> r & 1]
+
+        return [c for round_cards in canonical for c in sorted(round_cards)]
+
+    def _index_and_order(self, cards):
+        """Shared work of index and canonicalize
+
+        Returns:
+            the index, the suits in canonical order and the per-suit round masks
+        """
+
+        if len(cards) != self.n_cards:
+            raise ValueError('Expected {} cards for rounds {}.'.format(self.n_cards, self.rounds))
+
+        masks = [[0] * len(self.rounds) for _ in range(4)]
+        pos = 0
+        for i, n in enumerate(self.rounds):
+            for c in cards[pos:pos + n]:
+                c = int(c)
+                masks[c // 13][i] |= 1 << (c % 13)
+            pos += n
+
+        configs = [tuple(_POPCOUNT[m] for m in masks[s]) for s in range(4)]
+        suit_indexes = [self._suit_index(masks=masks[s]) for s in range(4)]
+        order = sorted(range(4), key=lambda s: (configs[s], suit_indexes[s]), reverse=True)
+
+        config_id = self._config_id[tuple(configs[s] for s in order)]
+
+        idx = 0
+        for start, end, m, count in self._groups[config_id]:
+            xs = sorted(suit_indexes[s] for s in order[start:end])
+            idx = idx * count + sum(comb(x + j, j + 1) for j, x in enumerate(xs))
+
+        return self.offsets[config_id] + idx, order, masks
+
+    def _suit_index(self, masks):
+        """Index of one suit's rank sets across the rounds"""
+
+        used = 0
+        n_used = 0
+        idx = 0
+
+        for mask in masks:
+            k = 0
+            colex = 0
+            m = mask
+            while m:
+                low = m & -m
+                r = low.bit_length() - 1
+                k += 1
+                # Position of the rank among the ranks not used by earlier rounds
+                colex += _COMB[r - _POPCOUNT[used & (low - 1)]][k]
+                m ^= low
+
+            idx = idx * _COMB[13 - n_used][k] + colex
+            used |= mask
+            n_used += k
+
+        return idx
+
+    def _suit_unindex(self, idx, config):
+        """Inverse of _suit_index, returning the rank mask of each round"""
+
+        bases = []
+        n_used = 0
+        for k in config:
+            bases.append(_COMB[13 - n_used][k])
+            n_used += k
+
+        colexes = [0] * len(config)
+        for i in range(len(config) - 1, -1, -1):
+            idx, colexes[i] = divmod(idx, bases[i])
+
+        masks = []
+        used = 0
+        for k, colex in zip(config, colexes):
+            free = [r for r in range(13) if not used >> r & 1]
+            mask = 0
+            for j in range(k, 0, -1):
+                p = j - 1
+                while _COMB[p + 1][j] <= colex:
+                    p += 1
+                colex -= _COMB[p][j]
+                mask |= 1 << free[p]
+            masks.append(mask)
+            used |= mask
+
+        return masks
+
+    def _multiset_unrank(self, idx, k):
+        """Ascending multiset of size k with the given colex index"""
+
+        xs = []
+        for j in range(k, 0, -1):
+            # Largest y with comb(y, j) <= idx, by bisection
+            low, high = j - 1, j
+            while comb(high, j) <= idx:
+                high *= 2
+            while high - low > 1:
+                mid = (low + high) // 2
+                if comb(mid, j) <= idx:
+                    low = mid
+                else:
+                    high = mid
+            idx -= comb(low, j)
+            xs.append(low - (j - 1))
+
+        return xs[::-1]
+
+
+def canonical_key(*groups):
+    """Hashable key shared by every suit relabeling of some groups of cards
+
+    Unlike HandIndexer this gives no dense index, but it handles any number of
+    groups (e.g. several players' hands plus a board) at the cost of a sort.
+
+    Args:
+        groups: bitmasks of each group of cards, in a fixed order
+
+    Returns:
+        tuple, sorted over the suits, of each suit's rank masks per group
+    """
+
+    return tuple(sorted(
+        tuple((m >> shift) & 0x1FFF for m in groups)
+        for shift in (0, 13, 26, 39)
+    ))
+
+
+_INDEXERS = {}
+
+
+def street_indexer(board_len):
+    """Shared indexer for two hole cards plus a board of the given length
+
+    The board is treated as one round, since the order in which the board cards
+    came out does not change the value of a hand. Use HandIndexer((2, 3, 1, 1))
+    directly when it does, e.g. for betting abstractions.
+
+    Args:
+        board_len (int): 0 (preflop) or 3 to 5
+
+    Returns:
+        HandIndexer
+    """
+
+    rounds = (2, board_len) if board_len else (2,)
+    if rounds not in _INDEXERS:
+        _INDEXERS[rounds] = HandIndexer(rounds=rounds)
+
+    return _INDEXERS[rounds]
+
+
+def board_indexer(board_len=3):
+    """Shared indexer for a board on its own, e.g. the 1755 canonical flops"""
+
+    rounds = (board_len,)
+    if rounds not in _INDEXERS:
+        _INDEXERS[rounds] = HandIndexer(rounds=rounds)
+
+    return _INDEXERS[rounds]
@@ -61,7 +61,7 @@ p2 = Player(chips=100)
 p3 = Player(chips=100)
 d = Deck()
 b = Board()
-g = Game(deck=d, board=b)
+g = Game(deck=d, board=b, small_blind=1)
 g.add_players([p1, p2, p3])
 
 g.play_hand()
@@ -0,0 +1,551 @@
+"""
+Equity of several known hands on a (possibly partial) board.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+from card_utils.cards import BATCH_BLOCK, POPCOUNT, cards_to_masks, mask_to_cards, subset_masks, to_mask
+from card_utils.deck import Deck
+from card_utils.isomorphism import canonical_key
+from game_utils.pots import PotLedger
+from interpreter.evaluator import HandEvaluator
+
+# Five-rank windows of every straight, the wheel included, as 13-bit rank masks
+_STRAIGHT_WINDOWS = np.array([0x1F << low for low in range(9)] + [0x100F], dtype=np.int64)
+
+
+def equity(hands, board=None, dead=None, iterations=100000, workers=1, seed=None, cache=None):
+    """Monte Carlo estimate of each hand's share of the pot
+
+    The sampling is sharded across a pool of worker processes, each with its own
+    independent random stream, and their win/tie counts are merged at the end.
+
+    Args:
+        hands (list): the players' hole cards, as card code lists, bitmasks or dictionaries
+        board: the 0 to 5 board cards dealt so far
+        dead: cards known to be out of the deck, e.g. folded or burnt cards
+        iterations (int): total number of runouts to sample
+        workers (int): number of worker processes
+        seed: seed for the random streams
+        cache (LRUCache): optional cache of earlier results, keyed on the
+            suit-canonical form of the spot, the number of iterations, the
+            number of workers and the seed
+
+    Returns:
+        dictionary with each player's 'equity' (ties split evenly), outright 'win'
+        and 'tie' frequencies, plus the number of 'iterations' sampled
+    """
+
+    hand_masks, board_mask, dead_mask = _known_cards(hands=hands, board=board, dead=dead)
+
+    if cache is not None:
+        key = ('sampled', iterations, workers, seed, canonical_key(board_mask, dead_mask, *hand_masks))
+        result = cache.get(key)
+        if result is None:
+            result = equity(hands=hand_masks, board=board_mask, dead=dead_mask,
+                            iterations=iterations, workers=workers, seed=seed)
+            cache.put(key, result)
+        return _copy_result(result)
+
+    board_len = 5 - bin(board_mask).count('1')
+
+    # Independent streams for every worker, split off a single seed
+    streams = np.random.SeedSequence(seed).spawn(workers)
+    shards = [iterations // workers + (i < iterations % workers) for i in range(workers)]
+    jobs = [
+        (hand_masks, board_mask, dead_mask, board_len, shards[i], streams[i])
+        for i in range(workers)
+    ]
+
+    if workers == 1:
+        results = [_equity_worker(jobs[0])]
+    else:
+        # Building the tables before the pool starts lets forked workers share them
+        HandEvaluator()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_equity_worker, jobs))
+
+    counts = np.sum(results, axis=0)
+
+    return _summarize(counts=counts, n=iterations)
+
+
+def exact_equity(hands, board=None, dead=None, cache=None):
+    """Exact share of the pot for each hand, enumerating every remaining runout
+
+    The hole cards and the board dealt so far are evaluated once, and each runout
+    only adds its own cards on top of that (see HandEvaluator.evaluate_runouts).
+    This is the right tool for turn and river spots and for heads-up flops, where
+    there are at most 990 runouts.
+
+    Args:
+        hands (list): the players' hole cards, as card code lists, bitmasks or dictionaries
+        board: the 0 to 5 board cards dealt so far
+        dead: cards known to be out of the deck, e.g. folded or burnt cards
+        cache (LRUCache): optional cache of earlier results, keyed on the
+            suit-canonical form of the spot
+
+    Returns:
+        dictionary with each player's 'equity' (ties split evenly), outright 'win'
+        and 'tie' frequencies, plus the number of runouts as 'iterations'
+    """
+
+    hand_masks, board_mask, dead_mask = _known_cards(hands=hands, board=board, dead=dead)
+
+    if cache is not None:
+        key = ('exact', canonical_key(board_mask, dead_mask, *hand_masks))
+        result = cache.get(key)
+        if result is None:
+            result = exact_equity(hands=hand_masks, board=board_mask, dead=dead_mask)
+            cache.put(key, result)
+        return _copy_result(result)
+
+    known = board_mask | dead_mask
+    for m in hand_masks:
+        known |= m
+
+    live = [c for c in range(52) if not known >> c & 1]
+    runouts = subset_masks(cards=live, k=5 - len(mask_to_cards(board_mask)))
+
+    evaluator = HandEvaluator()
+    base_masks = np.asarray(hand_masks, dtype=np.int64) | board_mask
+    counts = np.zeros((3, len(hand_masks)))
+
+    for start in range(0, len(runouts), BATCH_BLOCK):
+        ranks = evaluator.evaluate_runouts(base_masks=base_masks, runout_masks=runouts[start:start + BATCH_BLOCK])
+        counts += _rank_counts(ranks=ranks)
+
+    return _summarize(counts=counts, n=len(runouts))
+
+
+def adaptive_equity(hands, board=None, dead=None, target_stderr=0.001, target_width=None, confidence=0.95,
+                    batch_size=10000, max_iterations=1000000, stratified=False, seed=None):
+    """Monte Carlo equity that samples until a requested precision is reached
+
+    Runouts are sampled in batches. The mean and variance of every player's pot
+    share are kept as running sums merged batch by batch, and sampling stops as
+    soon as every player's standard error is within target_stderr and the
+    confidence interval is no wider than target_width.
+
+    With stratified=True the runouts are split by their first card, and first
+    cards that are the same up to a relabeling of the suits that leaves the known
+    cards in place are merged into one stratum, which is sampled through a single
+    representative. Every batch covers every stratum in proportion to its size,
+    so the variance between strata drops out of the estimate.
+
+    Args:
+        hands (list): the players' hole cards, as card code lists, bitmasks or dictionaries
+        board: the 0 to 4 board cards dealt so far. A complete board is evaluated exactly
+        dead: cards known to be out of the deck
+        target_stderr (float): the standard error to reach, or None
+        target_width (float): the width of the confidence interval to reach, or None
+        confidence (float): confidence level of the interval
+        batch_size (int): runouts sampled between two checks
+        max_iterations (int): the most runouts to sample, reached or not
+        stratified (bool): whether to sample the runouts stratified by first card
+        seed: seed for the random stream
+
+    Returns:
+        dictionary with each player's 'equity', 'win' and 'tie' frequencies, the
+        number of 'iterations' sampled, each player's 'stderr' and (P, 2) confidence
+        'interval' of the equity, and whether the target was 'converged' on
+    """
+
+    if target_stderr is None and target_width is None:
+        raise ValueError('Give a target standard error, a target interval width or both.')
+
+    hand_masks, board_mask, dead_mask = _known_cards(hands=hands, board=board, dead=dead)
+    board_len = 5 - len(mask_to_cards(board_mask))
+
+    if board_len == 0:
+        result = exact_equity(hands=hand_masks, board=board_mask, dead=dead_mask)
+        result['stderr'] = np.zeros(len(hand_masks))
+        result['interval'] = np.stack([result['equity'], result['equity']], axis=1)
+        result['converged'] = True
+        return result
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    limit = target_stderr if target_stderr is not None else np.inf
+    if target_width is not None:
+        limit = min(limit, target_width / (2 * z))
+
+    known = board_mask | dead_mask
+    for m in hand_masks:
+        known |= m
+
+    if stratified:
+        strata = _runout_strata(hand_masks=hand_masks, board_mask=board_mask, dead_mask=dead_mask, known=known)
+    else:
+        strata = [(0, 1.0)]
+
+    evaluator = HandEvaluator()
+    deck = Deck(seed=seed)
+    hand_masks = np.asarray(hand_masks, dtype=np.int64)
+    weights = np.array([w for _, w in strata])
+    dealt = board_len - (1 if stratified else 0)
+
+    # Running count, means of (share, win, tie) and sum of squared deviations of the share, per stratum
+    counts = np.zeros(len(strata))
+    means = np.zeros((len(strata), 3, len(hand_masks)))
+    squares = np.zeros((len(strata), len(hand_masks)))
+    converged = False
+
+    while counts.sum() < max_iterations:
+        # At least two runouts per stratum, so that every stratum has a variance
+        sizes = np.maximum(2, np.round(weights * batch_size).astype(np.int64))
+        for s, (card_mask, _) in enumerate(strata):
+            runouts = deck.deal_many(n_deals=sizes[s], n_players=0, board_len=dealt, dead_cards=known | card_mask)
+            ranks = evaluator.evaluate_masks((cards_to_masks(runouts) | board_mask | card_mask)[:, None] | hand_masks)
+            samples = _rank_samples(ranks=ranks)
+
+            # Chan et al.'s update merges the batch into the running moments
+            batch_mean = samples.mean(axis=1)
+            batch_squares = ((samples[0] - batch_mean[0]) ** 2).sum(axis=0)
+            total = counts[s] + sizes[s]
+            delta = batch_mean - means[s]
+            squares[s] += batch_squares + delta[0] ** 2 * counts[s] * sizes[s] / total
+            means[s] += delta * sizes[s] / total
+            counts[s] = total
+
+        stderr = np.sqrt((weights[:, None] ** 2 * squares / ((counts - 1) * counts)[:, None]).sum(axis=0))
+        if stderr.max() <= limit:
+            converged = True
+            break
+
+    estimate = np.tensordot(weights, means, axes=1)
+
+    return {
+        'equity': estimate[0],
+        'win': estimate[1],
+        'tie': estimate[2],
+        'iterations': int(counts.sum()),
+        'stderr': stderr,
+        'interval': np.stack([estimate[0] - z * stderr, estimate[0] + z * stderr], axis=1),
+        'converged': converged
+    }
+
+
+def multiway_equity(hands, board=None, dead=None, stacks=None, prune=True):
+    """Exact all-in equity of 2 to 9 players, pot by pot, over every remaining runout
+
+    Every runout is ranked for all players at once (see
+    HandEvaluator.evaluate_runouts), and each pot is awarded among the players
+    eligible for it. With prune=True, the runouts are first grouped by all but
+    their last two cards (e.g. by flop when all-in preflop). A group whose pot
+    winner is already locked, because the leader's hand category is above
+    anything the other eligible players can still reach, is counted without
+    being ranked.
+
+    Args:
+        hands (list): the players' hole cards, as card code lists, bitmasks or dictionaries
+        board: the 0 to 5 board cards dealt so far
+        dead: cards known to be out of the deck
+        stacks (list): chips each player has put in, for side pots (see
+            PotLedger.build_pots). By default everyone is in for the same amount
+        prune (bool): whether to skip the runouts whose winners are decided early
+
+    Returns:
+        dictionary with each player's 'equity' as a share of all the chips in
+        the middle, outright 'win' and 'tie' frequencies in the main pot, the
+        'pots' as (amount, eligible players), the (n_pots, P) 'pot_equity' share of
+        each pot, the number of runouts as 'iterations' and how many of them were
+        'pruned'
+    """
+
+    if not 2 <= len(hands) <= 9:
+        raise ValueError('Multi-way equity is computed for 2 to 9 players, not {}.'.format(len(hands)))
+
+    hand_masks, board_mask, dead_mask = _known_cards(hands=hands, board=board, dead=dead)
+    n_players = len(hand_masks)
+    if stacks is not None and len(stacks) != n_players:
+        raise ValueError('Got {} stacks for {} players.'.format(len(stacks), n_players))
+
+    ledger = PotLedger(n_players=n_players)
+    for player, amount in enumerate(stacks if stacks is not None else [1] * n_players):
+        ledger.add(player=player, amount=amount)
+    pots = ledger.build_pots()
+    eligible = np.zeros((len(pots), n_players), dtype=bool)
+    for j, (_, players) in enumerate(pots):
+        eligible[j, players] = True
+
+    known = board_mask | dead_mask
+    for m in hand_masks:
+        known |= m
+
+    live = [c for c in range(52) if not known >> c & 1]
+    to_deal = 5 - len(mask_to_cards(board_mask))
+    runouts = subset_masks(cards=live, k=to_deal)
+
+    evaluator = HandEvaluator()
+    base_masks = np.asarray(hand_masks, dtype=np.int64) | board_mask
+    counts = np.zeros((len(pots), 3, n_players))
+
+    # Group the runouts by their lowest cards, which leaves at most two to come
+    prefix_len = max(0, to_deal - 2)
+    if prune and to_deal > 0:
+        prefixes = np.zeros(len(runouts), dtype=np.int64)
+        rest = runouts.copy()
+        for _ in range(prefix_len):
+            low = rest & -rest
+            prefixes |= low
+            rest ^= low
+
+        # subset_masks is in lexicographic order, so every group is one contiguous run
+        starts = np.flatnonzero(np.concatenate([[True], prefixes[1:] != prefixes[:-1]]))
+        groups = prefixes[starts]
+        group_sizes = np.diff(np.append(starts, len(runouts)))
+
+        leaders, locked = _locked_pots(evaluator=evaluator, base_masks=base_masks, prefixes=groups,
+                                       live=sum(1 << c for c in live), to_come=to_deal - prefix_len,
+                                       eligible=eligible)
+
+        # Only groups with every pot locked are skipped, the leaders winning outright
+        decided = locked.all(axis=1)
+        for j in range(len(pots)):
+            wins = np.bincount(leaders[decided, j], weights=group_sizes[decided], minlength=n_players)
+            counts[j, 0] += wins
+            counts[j, 1] += wins
+
+        ranked = runouts[~np.repeat(decided, group_sizes)]
+    else:
+        ranked = runouts
+
+    for start in range(0, len(ranked), BATCH_BLOCK):
+        ranks = evaluator.evaluate_runouts(base_masks=base_masks, runout_masks=ranked[start:start + BATCH_BLOCK])
+        for j in range(len(pots)):
+            counts[j] += _rank_counts(ranks=np.where(eligible[j], ranks, -1))
+
+    pot_equity = counts[:, 0] / len(runouts)
+    amounts = np.array([amount for amount, _ in pots], dtype=np.float64)
+
+    return {
+        'equity': amounts @ pot_equity / amounts.sum(),
+        'win': counts[0, 1] / len(runouts),
+        'tie': counts[0, 2] / len(runouts),
+        'pots': pots,
+        'pot_equity': pot_equity,
+        'iterations': len(runouts),
+        'pruned': len(runouts) - len(ranked)
+    }
+
+
+def _locked_pots(evaluator, base_masks, prefixes, live, to_come, eligible):
+    """Finds the groups of runouts in which a pot's winner can no longer change
+
+    Args:
+        evaluator (HandEvaluator):
+        base_masks (np.ndarray): (P,) hole cards plus board of each player
+        prefixes (np.ndarray): (G,) bitmasks of the runout cards shared by each group
+        live (int): bitmask of every card that can still come
+        to_come (int): cards dealt after the prefix
+        eligible (np.ndarray): (n_pots, P) players eligible for each pot
+
+    Returns:
+        (G, n_pots) leader of every pot in every group and (G, n_pots) whether
+        that leader is certain to win the pot outright
+    """
+
+    known = base_masks | prefixes[:, None]
+    ranks = evaluator.evaluate_masks(known)
+    category = evaluator.rank_category[ranks]
+
+    leaders = np.empty((len(prefixes), len(eligible)), dtype=np.int64)
+    locked = np.zeros((len(prefixes), len(eligible)), dtype=bool)
+
+    # Every ceiling is at least trips, so only groups with a straight or better can lock
+    candidates = np.flatnonzero(category.max(axis=1) > 3)
+    ceiling = _category_ceiling(known=known[candidates], live=live & ~prefixes[candidates, None], to_come=to_come)
+
+    for j, players in enumerate(eligible):
+        leaders[:, j] = np.where(players, ranks, -1).argmax(axis=1)
+
+        leader = leaders[candidates, j]
+        others = players & (np.arange(len(players)) != leader[:, None])
+        best_other = np.where(others, ceiling, -1).max(axis=1)
+        locked[candidates, j] = category[candidates, leader] > best_other
+
+    return leaders, locked
+
+
+def _category_ceiling(known, live, to_come):
+    """Upper bound on the hand category each player can reach
+
+    Only the categories from a straight up are told apart; anything below a
+    straight is reported as trips, which is still an upper bound.
+
+    Args:
+        known (np.ndarray): (G, P) bitmasks of each player's cards so far
+        live (np.ndarray): (G, 1) bitmasks of the cards that can still come
+        to_come (int): number of cards still to come
+
+    Returns:
+        (G, P) hand category indices, see HandEvaluator.hand_types
+    """
+
+    suits = np.stack([(known >> (13 * s)) & 0x1FFF for s in range(4)], axis=-1)
+    live_suits = np.stack([(live >> (13 * s)) & 0x1FFF for s in range(4)], axis=-1)
+    bits = 1 << np.arange(13)
+
+    rank_counts = ((suits[..., None] & bits) != 0).sum(axis=-2)
+    live_counts = ((live_suits[..., None] & bits) != 0).sum(axis=-2)
+    reachable = np.minimum(live_counts, to_come)
+
+    # Missing cards of a five-rank window, for every suit and for any suit
+    missing = _STRAIGHT_WINDOWS & ~suits[..., None]
+    straight_flush = ((POPCOUNT[missing] <= to_come) & ((missing & ~live_suits[..., None]) == 0)).any(axis=(-2, -1))
+
+    ranks = np.bitwise_or.reduce(suits, axis=-1)
+    live_ranks = np.bitwise_or.reduce(live_suits, axis=-1)
+    missing = _STRAIGHT_WINDOWS & ~ranks[..., None]
+    straight = ((POPCOUNT[missing] <= to_come) & ((missing & ~live_ranks[..., None]) == 0)).any(axis=-1)
+
+    quads = (rank_counts + reachable >= 4).any(axis=-1)
+    flush = (POPCOUNT[suits] + np.minimum(POPCOUNT[live_suits], to_come) >= 5).any(axis=-1)
+
+    # Trips of one rank plus a pair of another, each needing its own live cards
+    need_three = np.where(rank_counts + reachable >= 3, np.maximum(3 - rank_counts, 0), to_come + 1)
+    need_two = np.where(rank_counts + reachable >= 2, np.maximum(2 - rank_counts, 0), to_come + 1)
+    combined = need_three[..., :, None] + need_two[..., None, :]
+    full_house = ((combined <= to_come) & ~np.eye(13, dtype=bool)).any(axis=(-2, -1))
+
+    ceiling = np.full(known.shape, 3, dtype=np.int64)
+    for category, reached in ((4, straight), (5, flush), (6, full_house), (7, quads), (8, straight_flush)):
+        ceiling[reached] = category
+
+    return ceiling
+
+
+def _runout_strata(hand_masks, board_mask, dead_mask, known):
+    """Groups the possible first runout cards into suit-isomorphic strata
+
+    Returns:
+        list of (bitmask of a representative card, probability of the stratum)
+    """
+
+    live = [c for c in range(52) if not known >> c & 1]
+    strata = {}
+    for c in live:
+        key = canonical_key(board_mask, dead_mask, *hand_masks, 1 << c)
+        strata.setdefault(key, []).append(c)
+
+    return [(1 << cards[0], len(cards) / len(live)) for cards in strata.values()]
+
+
+def _equity_worker(job):
+    """Samples one shard of the runouts
+
+    Args:
+        job (tuple): hand masks, board mask, dead mask, cards left to deal,
+            number of runouts and the SeedSequence of this shard
+
+    Returns:
+        (3, P) array of summed pot shares, outright wins and ties
+    """
+
+    hand_masks, board_mask, dead_mask, board_len, n, stream = job
+
+    evaluator = HandEvaluator()
+    deck = Deck(seed=stream)
+    counts = np.zeros((3, len(hand_masks)))
+
+    known = board_mask | dead_mask
+    for m in hand_masks:
+        known |= m
+
+    for start in range(0, n, BATCH_BLOCK):
+        runouts = deck.deal_many(n_deals=min(BATCH_BLOCK, n - start), n_players=0, board_len=board_len,
+                                 dead_cards=known)
+        counts += _showdown_counts(evaluator=evaluator,
+                                   hand_masks=hand_masks,
+                                   board_masks=cards_to_masks(runouts) | board_mask)
+
+    return counts
+
+
+def _showdown_counts(evaluator, hand_masks, board_masks):
+    """Shares out the pot over a set of complete boards
+
+    Args:
+        evaluator (HandEvaluator):
+        hand_masks (list): bitmask of each player's hole cards
+        board_masks (np.ndarray): bitmasks of complete boards
+
+    Returns:
+        (3, P) array of summed pot shares, outright wins and ties
+    """
+
+    ranks = evaluator.evaluate_masks(board_masks[:, None] | np.asarray(hand_masks, dtype=np.int64))
+
+    return _rank_counts(ranks=ranks)
+
+
+def _rank_samples(ranks):
+    """Per-board pot share, outright win and tie of every player
+
+    Returns:
+        (3, N, P) array of pot shares, outright wins and ties on each of N boards
+    """
+
+    winners = ranks == ranks.max(axis=1, keepdims=True)
+    n_winners = winners.sum(axis=1, keepdims=True)
+
+    return np.stack([winners / n_winners, winners & (n_winners == 1), winners & (n_winners > 1)])
+
+
+def _rank_counts(ranks):
+    """Shares out the pot given the (N, P) ranks of every player on N boards
+
+    Returns:
+        (3, P) array of summed pot shares, outright wins and ties
+    """
+
+    return _rank_samples(ranks=ranks).sum(axis=1)
+
+
+def _known_cards(hands, board, dead):
+    """Translates the inputs into bitmasks and checks that every hand has two cards and no card is used twice
+
+    Returns:
+        list of hand masks, the board mask and the dead card mask
+    """
+
+    hand_masks = [to_mask(h) for h in hands]
+    board_mask = to_mask(board) if board is not None else 0
+    dead_mask = to_mask(dead) if dead is not None else 0
+
+    for m in hand_masks:
+        if len(mask_to_cards(m)) != 2:
+            raise ValueError('Each hand must be exactly two hole cards, not {}.'.format(len(mask_to_cards(m))))
+
+    n_cards = 0
+    known = 0
+    for m in hand_masks + [board_mask, dead_mask]:
+        n_cards += len(mask_to_cards(m))
+        known |= m
+
+    if len(mask_to_cards(known)) != n_cards:
+        raise ValueError('The same card appears more than once in the hands, board and dead cards.')
+
+    if len(mask_to_cards(board_mask)) > 5:
+        raise ValueError('A board has at most 5 cards.')
+
+    return hand_masks, board_mask, dead_mask
+
+
+def _summarize(counts, n):
+    """Turns summed shares, wins and ties into frequencies"""
+
+    return {
+        'equity': counts[0] / n,
+        'win': counts[1] / n,
+        'tie': counts[2] / n,
+        'iterations': n
+    }
+
+
+def _copy_result(result):
+    """Copies a cached result so that callers cannot modify the cached arrays"""
+    return {k: v.copy() if isinstance(v, np.ndarray) else v for k, v in result.items()}
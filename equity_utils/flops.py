@@ -0,0 +1,227 @@
+"""
+Precomputed flop-texture index.
+
+There are 22100 flops but only 1755 of them are different up to a relabeling
+of the suits. The index holds, for each of those canonical flops, a row of
+texture features (pairing, suits, connectedness, the class of the nut hand)
+and the mean all-in equity of each of the 169 preflop classes against a random
+hand on it. It is generated once with the engine and written to a versioned
+binary file opened through mmap, like the preflop tables, and any raw flop is
+looked up through its suit-canonical index.
+"""
+
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+
+from card_utils.cards import COMBOS, RUNOUT_BLOCK
+from card_utils.isomorphism import board_indexer
+from equity_utils.preflop import preflop_class
+from equity_utils.ranges import ShowdownSweep
+from interpreter.engine import InterpreterEngine
+from interpreter.evaluator import HandEvaluator
+
+INDEX_VERSION = 1
+
+# Texture columns
+PAIRED = 0          # 0 unpaired, 1 paired, 2 trips
+SUITS = 1           # number of different suits, 1 being monotone
+HIGH_CARD = 2       # rank of the highest card, 0 being a deuce
+SPAN = 3            # distance between the highest and lowest distinct ranks
+STRAIGHTS = 4       # number of two-rank holdings that make a straight
+NUT_CLASS = 5       # hand category of the best possible holding
+N_TEXTURES = 6
+
+# magic, version, number of flops, texture columns, classes, runouts per flop (0 for all)
+_HEADER = struct.Struct('<8sIIIII')
+_HEADER_SIZE = 64
+_MAGIC = b'PKFLOPTX'
+
+# Preflop class of every holding, in the order of card_utils.cards.COMBOS
+_COMBO_CLASSES = np.array([preflop_class(c) for c in COMBOS])
+
+# Canonical flops scored per job in build_flop_index
+_FLOPS_PER_JOB = 25
+
+
+class FlopIndex:
+
+    def __init__(self, path):
+        """Opens an index file generated by build_flop_index
+
+        Args:
+            path (str): location of the index file
+        """
+
+        with open(path, 'rb') as f:
+            magic, version, n_flops, n_textures, n_classes, runouts = _HEADER.unpack(f.read(_HEADER.size))
+
+        if magic != _MAGIC:
+            raise ValueError('{} is not a flop index file.'.format(path))
+        if version != INDEX_VERSION:
+            raise ValueError('Flop index version {} does not match {}.'.format(version, INDEX_VERSION))
+
+        self.runouts = runouts
+        self.indexer = board_indexer(board_len=3)
+        self.hand_types = HandEvaluator().hand_types
+
+        self.textures = np.memmap(path, dtype=np.int8, mode='r', offset=_HEADER_SIZE, shape=(n_flops, n_textures))
+        self.equities = np.memmap(path, dtype=np.float16, mode='r', offset=_HEADER_SIZE + n_flops * n_textures,
+                                  shape=(n_flops, n_classes))
+
+    def index(self, flop):
+        """Canonical index in [0, 1755) of a raw flop"""
+        return self.indexer.index(flop)
+
+    def texture(self, flop):
+        """Texture features of a flop
+
+        Args:
+            flop: the three flop card codes
+
+        Returns:
+            dictionary with the canonical 'index', 'paired' (0 to 2), 'suits' (1 to 3),
+            'monotone', 'high_card', 'span', 'straights' and the 'nut_class' name
+        """
+
+        idx = self.index(flop)
+        row = self.textures[idx].tolist()
+
+        return {
+            'index': idx,
+            'paired': row[PAIRED],
+            'suits': row[SUITS],
+            'monotone': row[SUITS] == 1,
+            'high_card': row[HIGH_CARD],
+            'span': row[SPAN],
+            'straights': row[STRAIGHTS],
+            'nut_class': self.hand_types[row[NUT_CLASS]]
+        }
+
+    def class_equity(self, flop, hand):
+        """Mean all-in equity of a hand's preflop class against a random hand on a flop
+
+        Args:
+            flop: the three flop card codes
+            hand: the two hole card codes, or a preflop class index
+
+        Returns:
+            the equity, averaged over the class's holdings that the flop does not block,
+            or nan when the flop blocks all of them
+        """
+
+        cls = hand if isinstance(hand, (int, np.integer)) else preflop_class(hand)
+
+        return float(self.equities[self.index(flop), cls])
+
+
+def build_flop_index(path, runouts=None, workers=1, seed=None):
+    """Scores every canonical flop with the engine and writes the index file
+
+    Args:
+        path (str): where to write the index file
+        runouts (int): turn and river runouts sampled per flop, or None to
+            enumerate all 1176 of them
+        workers (int): number of worker processes
+        seed: seed for the sampled runouts
+    """
+
+    indexer = board_indexer(board_len=3)
+    chunks = np.array_split(np.arange(indexer.size), -(-indexer.size // _FLOPS_PER_JOB))
+    streams = np.random.SeedSequence(seed).spawn(len(chunks))
+    jobs = [(chunk, runouts, stream) for chunk, stream in zip(chunks, streams)]
+
+    if workers == 1:
+        results = [_flop_worker(job) for job in jobs]
+    else:
+        HandEvaluator()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_flop_worker, jobs))
+
+    textures = np.concatenate([r[0] for r in results])
+    equities = np.concatenate([r[1] for r in results])
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, INDEX_VERSION, len(textures), N_TEXTURES, 169, runouts or 0)
+                .ljust(_HEADER_SIZE, b'\0'))
+        textures.tofile(f)
+        equities.tofile(f)
+
+
+def _flop_worker(job):
+    """Scores one chunk of canonical flops
+
+    Returns:
+        (n, N_TEXTURES) int8 texture rows and (n, 169) float16 class equities
+    """
+
+    flop_ids, runouts, stream = job
+
+    engine = InterpreterEngine()
+    indexer = board_indexer(board_len=3)
+    rng = np.random.default_rng(stream)
+
+    textures = np.zeros((len(flop_ids), N_TEXTURES), dtype=np.int8)
+    equities = np.zeros((len(flop_ids), 169), dtype=np.float16)
+
+    for row, idx in enumerate(flop_ids):
+        flop = indexer.unindex(int(idx))
+        textures[row] = _flop_texture(flop=flop, engine=engine)
+        equities[row] = _class_equities(flop=flop, engine=engine, runouts=runouts, rng=rng)
+
+    return textures, equities
+
+
+def _flop_texture(flop, engine):
+    """Texture row of one flop"""
+
+    ranks = sorted({c % 13 for c in flop})
+    texture = np.zeros(N_TEXTURES, dtype=np.int8)
+
+    texture[PAIRED] = 3 - len(ranks)
+    texture[SUITS] = len({c // 13 for c in flop})
+    texture[HIGH_CARD] = ranks[-1]
+    texture[SPAN] = ranks[-1] - ranks[0]
+
+    # A straight needs five ranks in a row, with the ace also playing low
+    if len(ranks) == 3:
+        windows = [set(range(low, low + 5)) for low in range(9)] + [{12, 0, 1, 2, 3}]
+        texture[STRAIGHTS] = sum(
+            1 for a, b in combinations([r for r in range(13) if r not in ranks], 2)
+            if any(w == set(ranks) | {a, b} for w in windows)
+        )
+
+    nut = engine.rank_holdings(board=flop).max()
+    texture[NUT_CLASS] = engine.evaluator.rank_category[nut]
+
+    return texture
+
+
+def _class_equities(flop, engine, runouts, rng):
+    """Mean equity of each preflop class against a random hand on one flop"""
+
+    live = [c for c in range(52) if c not in flop]
+    turn_river = np.array(list(combinations(live, 2)))
+    if runouts is not None and runouts < len(turn_river):
+        turn_river = turn_river[rng.choice(len(turn_river), size=runouts, replace=False)]
+
+    boards = np.hstack([np.tile(flop, (len(turn_river), 1)), turn_river])
+
+    # A random opponent is every holding with the same weight
+    shares = np.zeros(len(COMBOS))
+    counts = np.zeros(len(COMBOS))
+    for start in range(0, len(boards), RUNOUT_BLOCK):
+        sweep = ShowdownSweep(ranks=engine.rank_holdings(board=boards[start:start + RUNOUT_BLOCK]))
+        wins, ties, losses = sweep.counts(reach=np.ones(len(COMBOS)))
+        shares += (wins + 0.5 * ties).sum(axis=0)
+        counts += (wins + ties + losses).sum(axis=0)
+
+    seen = counts > 0
+    class_shares = np.bincount(_COMBO_CLASSES[seen], weights=shares[seen] / counts[seen], minlength=169)
+    class_counts = np.bincount(_COMBO_CLASSES[seen], minlength=169)
+
+    # A class whose holdings are all blocked by the flop has no equity
+    with np.errstate(invalid='ignore'):
+        return class_shares / class_counts
@@ -0,0 +1,129 @@
+"""
+Hand strength and hand potential of a holding against a range.
+
+Following Billings et al., a holding is compared with every opponent holding
+now and again after the board is dealt out. Each (opponent holding, runout)
+pair falls into one cell of a 3x3 table: whether the holding is behind, tied
+or ahead now, and whether it is behind, tied or ahead at the end. From that
+one table:
+
+    HS   = (ahead + tied / 2) / total, counted now
+    PPOT = chance of ending ahead when behind now, ties counting half
+    NPOT = chance of ending behind when ahead now, ties counting half
+    EHS  = HS * (1 - NPOT) + (1 - HS) * PPOT
+
+EHS² is the mean over the runouts of the squared hand strength at the end,
+taken from the same table split by runout. Runouts that block every opponent
+holding are left out of the mean.
+"""
+
+from itertools import combinations
+
+import numpy as np
+
+from card_utils.cards import COMBO_MASKS, mask_to_cards, to_mask
+from equity_utils.ranges import parse_range
+from interpreter.engine import shared_engine
+
+BEHIND = 0
+TIED = 1
+AHEAD = 2
+
+
+def hand_potential(hole_cards, board, opponent_range=None, lookahead=None, engine=None):
+    """Hand strength, positive and negative potential and EHS² of one holding
+
+    Args:
+        hole_cards: the two hole cards, as a card code list, bitmask or dictionary
+        board: the 3 (flop) or 4 (turn) board cards
+        opponent_range: (1326,) weights or range text for the opponent, or None
+            for a random hand. Holdings blocked by the hole cards or the board
+            are ignored
+        lookahead (int): board cards to deal, 1 or 2. By default the board is
+            dealt out to the river. A one-card lookahead on the flop (Billings'
+            PPOT1) ranks 47 runouts instead of 1081
+        engine (InterpreterEngine): optional engine to rank the hands
+
+    Returns:
+        dictionary with 'hs', 'ppot', 'npot', 'ehs' and 'ehs2', the 3x3
+        'potential' table of opponent weight by state now (rows) and at the end
+        (columns), indexed BEHIND, TIED and AHEAD, and the number of 'runouts'
+    """
+
+    engine = engine if engine is not None else shared_engine()
+    evaluator = engine.evaluator
+
+    hole_mask = to_mask(hole_cards)
+    board_mask = to_mask(board)
+    board_len = bin(board_mask).count('1')
+    if bin(hole_mask).count('1') != 2 or hole_mask & board_mask:
+        raise ValueError('The hole cards must be two cards that are not on the board.')
+    if board_len not in (3, 4):
+        raise ValueError('Hand potential needs a flop or turn board, not {} cards.'.format(board_len))
+
+    n_cards = 5 - board_len if lookahead is None else lookahead
+    if not 1 <= n_cards <= 5 - board_len:
+        raise ValueError('A {} card board can look {} cards ahead at most.'.format(board_len, 5 - board_len))
+
+    if opponent_range is None:
+        weights = np.ones(len(COMBO_MASKS))
+    elif isinstance(opponent_range, str):
+        weights = parse_range(opponent_range)
+    else:
+        weights = np.asarray(opponent_range, dtype=np.float64)
+
+    # Only the opponent holdings that can be dealt are ranked
+    dead = hole_mask | board_mask
+    opponents = np.flatnonzero(((COMBO_MASKS & dead) == 0) & (weights > 0))
+    if len(opponents) == 0:
+        raise ValueError('The opponent range is empty once the known cards are removed.')
+    opponent_masks = COMBO_MASKS[opponents]
+    weights = weights[opponents]
+
+    board_mask = np.int64(board_mask)
+    hole_rank = int(evaluator.evaluate_masks(np.array([hole_mask | board_mask], dtype=np.int64))[0])
+    now = np.sign(hole_rank - evaluator.evaluate_masks(opponent_masks | board_mask).astype(np.int64)) + 1
+
+    live = mask_to_cards(~dead & ((1 << 52) - 1))
+    runouts = np.array([sum(1 << c for c in cards) for cards in combinations(live, n_cards)], dtype=np.int64)
+    final_boards = board_mask | runouts
+
+    hole_ranks = evaluator.evaluate_masks(np.int64(hole_mask) | final_boards)
+    opponent_ranks = evaluator.evaluate_masks(opponent_masks | final_boards[:, None])
+    final = np.sign(hole_ranks[:, None].astype(np.int64) - opponent_ranks) + 1
+    reach = np.where((opponent_masks & runouts[:, None]) == 0, weights, 0)
+
+    # One (runout, now, final) table holds everything
+    cells = (np.arange(len(runouts))[:, None] * 9 + now * 3 + final).ravel()
+    table = np.bincount(cells, weights=reach.ravel(), minlength=9 * len(runouts)).reshape(-1, 3, 3)
+
+    potential = table.sum(axis=0)
+    totals = potential.sum(axis=1)
+
+    hs = (totals[AHEAD] + totals[TIED] / 2) / totals.sum()
+    ppot = _ratio(potential[BEHIND, AHEAD] + potential[BEHIND, TIED] / 2 + potential[TIED, AHEAD] / 2,
+                  totals[BEHIND] + totals[TIED] / 2)
+    npot = _ratio(potential[AHEAD, BEHIND] + potential[TIED, BEHIND] / 2 + potential[AHEAD, TIED] / 2,
+                  totals[AHEAD] + totals[TIED] / 2)
+
+    # A narrow range can be blocked entirely by some runouts, which say nothing
+    per_runout = table.sum(axis=1)
+    seen = per_runout.sum(axis=1)
+    per_runout = per_runout[seen > 0]
+    strength = (per_runout[:, AHEAD] + per_runout[:, TIED] / 2) / seen[seen > 0]
+
+    return {
+        'hs': float(hs),
+        'ppot': ppot,
+        'npot': npot,
+        'ehs': float(hs * (1 - npot) + (1 - hs) * ppot),
+        'ehs2': float((strength ** 2).mean()),
+        'potential': potential,
+        'runouts': len(runouts)
+    }
+
+
+def _ratio(numerator, denominator):
+    """numerator / denominator, or 0 when nothing is counted"""
+
+    return float(numerator / denominator) if denominator > 0 else 0.0
@@ -0,0 +1,341 @@
+"""
+Weighted hand ranges and range-vs-range equity.
+
+A range is a (1326,) vector with a weight for every holding, in the order of
+card_utils.cards.COMBOS. Ranges can be read from the usual text notation, e.g.
+'AKs, TT+, 76s-54s, A5s:0.5, AsKd'.
+
+Equity between two ranges is computed one complete board at a time. On a
+complete board every holding is ranked at once and sorted by strength, and a
+prefix sum over the opponent's weights in strength order gives the weight each
+holding beats, ties and loses to. Card removal is handled by subtracting the
+same prefix sums taken over the 51 holdings that contain each of the hand's two
+cards, so no 1326x1326 comparison is ever made. Earlier streets enumerate or
+sample the runouts and add up the per-board sums.
+"""
+
+from itertools import combinations
+
+import numpy as np
+
+from card_utils.cards import (COMBO_INDEX, COMBO_MASKS, COMBOS, RANK_CHARS, RUNOUT_BLOCK, format_cards, mask_to_cards,
+                              parse_cards, to_mask)
+from card_utils.deck import Deck
+from interpreter.engine import shared_engine
+
+# The 51 holdings that contain each card
+_CARD_COMBOS = np.array([np.flatnonzero((COMBOS == c).any(axis=1)) for c in range(52)])
+
+# Position of every holding within the rows of its first and second card
+_CARD_SLOT = [np.argmax(_CARD_COMBOS[COMBOS[:, k]] == np.arange(len(COMBOS))[:, None], axis=1) for k in range(2)]
+
+
+class ShowdownSweep:
+
+    def __init__(self, ranks):
+        """Sorts the holdings of one or more complete boards by strength
+
+        Args:
+            ranks (np.ndarray): (1326,) hand ranks of every holding on a board, or
+                (R, 1326) for R boards, with 0 for holdings that are blocked (see
+                InterpreterEngine.rank_holdings)
+        """
+
+        # Ranks fit in 16 bits, which lets the stable sorts run as radix sorts
+        ranks = np.asarray(ranks).astype(np.int16)
+        self.single = ranks.ndim == 1
+        ranks = np.atleast_2d(ranks)
+        self.valid = ranks > 0
+
+        # Everything is stored as flat indices into the per-call arrays, so the
+        # sweeps only ever do one np.take per lookup
+        n_boards, n = ranks.shape
+        boards = np.arange(n_boards)[:, None]
+
+        order = np.argsort(ranks, axis=1, kind='stable')
+        below, not_above = _tie_bounds(ranks=ranks, order=order)
+        self._gather = (order + boards * n).ravel()
+        self._below = below + boards * (n + 1)
+        self._not_above = not_above + boards * (n + 1)
+        self._end = boards * (n + 1) + n
+
+        # The same within the 51 holdings that contain each card, looked up at
+        # each hand's own slot in the rows of its two cards
+        card_ranks = ranks[:, _CARD_COMBOS]
+        card_order = np.argsort(card_ranks, axis=2, kind='stable')
+        card_below, card_not_above = _tie_bounds(ranks=card_ranks, order=card_order)
+        self._card_gather = (_CARD_COMBOS[np.arange(52)[:, None], card_order] + boards[:, :, None] * n).ravel()
+
+        self._card_below = []
+        self._card_not_above = []
+        self._card_end = []
+        for k in range(2):
+            row = (boards * 52 + COMBOS[:, k]) * 52
+            self._card_below.append(row + card_below[:, COMBOS[:, k], _CARD_SLOT[k]])
+            self._card_not_above.append(row + card_not_above[:, COMBOS[:, k], _CARD_SLOT[k]])
+            self._card_end.append(row + 51)
+
+    def counts(self, reach):
+        """Opponent weight that each holding beats, ties and loses to
+
+        Only opponent holdings that share no card with the hand (or the board)
+        are counted.
+
+        Args:
+            reach (np.ndarray): (1326,) weights of the opponent's holdings
+
+        Returns:
+            (1326,) arrays, or (R, 1326) for R boards, of the weight won against,
+            tied with and lost to. All three are 0 for blocked holdings
+        """
+
+        n_boards, n = self.valid.shape
+        reach = reach * self.valid
+        flat = reach.ravel()
+
+        prefix = np.zeros((n_boards, n + 1))
+        np.cumsum(flat.take(self._gather).reshape(n_boards, n), axis=1, out=prefix[:, 1:])
+        prefix = prefix.ravel()
+        wins = prefix.take(self._below)
+        not_above = prefix.take(self._not_above)
+        ties = not_above - wins
+        losses = prefix.take(self._end) - not_above
+
+        card_prefix = np.zeros((n_boards, 52, 52))
+        np.cumsum(flat.take(self._card_gather).reshape(n_boards, 52, 51), axis=2, out=card_prefix[:, :, 1:])
+        card_prefix = card_prefix.ravel()
+        for k in range(2):
+            below = card_prefix.take(self._card_below[k])
+            not_above = card_prefix.take(self._card_not_above[k])
+            wins -= below
+            ties -= not_above - below
+            losses -= card_prefix.take(self._card_end[k]) - not_above
+
+        # The hand itself shares both cards with itself, so it was taken out of
+        # the ties twice
+        ties += reach
+
+        wins, ties, losses = wins * self.valid, ties * self.valid, losses * self.valid
+        if self.single:
+            return wins[0], ties[0], losses[0]
+
+        return wins, ties, losses
+
+
+def parse_range(text):
+    """Reads a range written in the usual notation into a weight vector
+
+    Comma separated entries can be pairs ('TT'), suited or offsuit hands ('AKs',
+    'AKo') or both ('AK'), with '+' to raise the lower card up to the higher one
+    ('TT+', 'A2s+', 'KTo+'), dashed spans ('TT-77', 'A5s-A2s', '76s-54s') and single
+    holdings ('AsKd'). An entry may end in ':weight', and later entries overwrite
+    earlier ones.
+
+    Args:
+        text (str): the range, e.g. 'AKs, TT+, 76s-54s:0.5'
+
+    Returns:
+        (1326,) array of weights in the order of card_utils.cards.COMBOS
+    """
+
+    weights = np.zeros(len(COMBOS))
+
+    for entry in text.replace(' ', '').split(','):
+        if not entry:
+            continue
+
+        entry, _, weight = entry.partition(':')
+        weight = float(weight) if weight else 1.0
+
+        try:
+            combos = _entry_combos(entry)
+        except (KeyError, IndexError, ValueError):
+            raise ValueError('Cannot read range entry {!r}.'.format(entry))
+
+        weights[combos] = weight
+
+    return weights
+
+
+def format_range(weights):
+    """Lists the holdings of a range with a non-zero weight, e.g. for debugging
+
+    Returns:
+        dictionary of holding text (e.g. 'AsKd') to weight
+    """
+
+    return {format_cards(COMBOS[i]): float(weights[i]) for i in np.flatnonzero(weights > 0)}
+
+
+def range_equity(ranges, board=None, dead=None, iterations=None, seed=None, engine=None):
+    """Equity of one weighted range against another on a (possibly partial) board
+
+    Every pair of holdings that share no card with each other, the board and the
+    dead cards counts in proportion to the product of its weights. On the river
+    the result is exact from one sweep. On the flop and turn every runout is
+    enumerated, and preflop, or whenever iterations is given, runouts are sampled.
+
+    Args:
+        ranges (list): two ranges, each a (1326,) weight vector or range text
+        board: the 0 to 5 board cards dealt so far
+        dead: cards known to be out of the deck
+        iterations (int): number of runouts to sample. Preflop, 10000 when not given
+        seed: seed for the sampling
+        engine (InterpreterEngine): optional engine to rank the holdings
+
+    Returns:
+        dictionary with each range's 'equity' (ties split evenly), outright 'win'
+        and 'tie' frequencies, plus the number of runouts ('iterations') used
+    """
+
+    if len(ranges) != 2:
+        raise ValueError('Range equity is computed between exactly two ranges.')
+
+    weights = [parse_range(r) if isinstance(r, str) else np.asarray(r, dtype=np.float64) for r in ranges]
+    board_mask = to_mask(board) if board is not None else 0
+    dead_mask = to_mask(dead) if dead is not None else 0
+    if board_mask & dead_mask:
+        raise ValueError('The same card appears in the board and the dead cards.')
+
+    n_board = len(mask_to_cards(board_mask))
+    if n_board > 5:
+        raise ValueError('A board has at most 5 cards.')
+
+    # Holdings that use a known card are out of both ranges
+    known = board_mask | dead_mask
+    weights = [w * ((COMBO_MASKS & known) == 0) for w in weights]
+
+    engine = engine if engine is not None else shared_engine()
+    board_cards = mask_to_cards(board_mask)
+
+    if n_board == 5:
+        runouts = np.array([board_cards])
+    elif iterations is None and n_board >= 3:
+        live = [c for c in range(52) if not known >> c & 1]
+        extra = np.array(list(combinations(live, 5 - n_board)))
+        runouts = np.hstack([np.tile(board_cards, (len(extra), 1)), extra])
+    else:
+        deck = Deck(seed=seed)
+        extra = deck.deal_many(n_deals=iterations or 10000, n_players=0, board_len=5 - n_board,
+                               dead_cards=known or None)
+        runouts = np.hstack([np.tile(board_cards, (len(extra), 1)), extra])
+
+    # Summed weights of the pairs player 0 wins, ties and loses, over every runout
+    totals = np.zeros(3)
+    for start in range(0, len(runouts), RUNOUT_BLOCK):
+        block = runouts[start:start + RUNOUT_BLOCK].astype(np.int64)
+        sweep = ShowdownSweep(ranks=engine.rank_holdings(board=block))
+        wins, ties, losses = sweep.counts(reach=weights[1])
+        totals += [(wins @ weights[0]).sum(), (ties @ weights[0]).sum(), (losses @ weights[0]).sum()]
+
+    n_pairs = totals.sum()
+    if n_pairs == 0:
+        raise ValueError('The ranges have no holdings that can meet on this board.')
+
+    win = np.array([totals[0], totals[2]]) / n_pairs
+    tie = np.full(2, totals[1] / n_pairs)
+
+    return {
+        'equity': win + tie / 2,
+        'win': win,
+        'tie': tie,
+        'iterations': len(runouts)
+    }
+
+
+def _tie_bounds(ranks, order):
+    """Number of entries below and not above each entry, along the last axis
+
+    Args:
+        ranks (np.ndarray): values to compare along the last axis
+        order (np.ndarray): stable argsort of ranks along the last axis
+
+    Returns:
+        two arrays shaped like ranks: the count of strictly smaller entries and
+        the count of entries that are smaller or equal
+    """
+
+    ordered = np.take_along_axis(ranks, order, axis=-1)
+    m = ranks.shape[-1]
+    positions = np.broadcast_to(np.arange(m), ranks.shape)
+
+    # Within a run of equal values every entry shares the run's start and end
+    change = ordered[..., 1:] != ordered[..., :-1]
+    first = np.concatenate([np.ones(ranks.shape[:-1] + (1,), dtype=bool), change], axis=-1)
+    last = np.concatenate([change, np.ones(ranks.shape[:-1] + (1,), dtype=bool)], axis=-1)
+
+    starts = np.maximum.accumulate(np.where(first, positions, 0), axis=-1)
+    ends = np.minimum.accumulate(np.where(last, positions + 1, m)[..., ::-1], axis=-1)[..., ::-1]
+
+    below = np.empty(ranks.shape, dtype=np.int64)
+    not_above = np.empty(ranks.shape, dtype=np.int64)
+    np.put_along_axis(below, order, starts, axis=-1)
+    np.put_along_axis(not_above, order, ends, axis=-1)
+
+    return below, not_above
+
+
+def _entry_combos(entry):
+    """Holding indices of one range entry, without its weight"""
+
+    # A single holding, e.g. 'AsKd'
+    if len(entry) == 4 and entry[1].lower() in 'dhsc' and entry[3].lower() in 'dhsc':
+        a, b = parse_cards(entry)
+        if a == b:
+            raise ValueError('A holding needs two different cards.')
+        return [COMBO_INDEX[a, b]]
+
+    if '-' in entry:
+        first, last = entry.split('-')
+        hi1, lo1, kind1 = _hand_class(first)
+        hi2, lo2, kind2 = _hand_class(last)
+        if kind1 != kind2:
+            raise ValueError('Both ends of a span must be the same kind of hand.')
+
+        if hi1 == lo1 and hi2 == lo2:
+            classes = [(r, r) for r in range(min(hi1, hi2), max(hi1, hi2) + 1)]
+        elif hi1 == hi2:
+            classes = [(hi1, r) for r in range(min(lo1, lo2), max(lo1, lo2) + 1)]
+        elif hi1 - lo1 == hi2 - lo2:
+            gap = hi1 - lo1
+            classes = [(r + gap, r) for r in range(min(lo1, lo2), max(lo1, lo2) + 1)]
+        else:
+            raise ValueError('A span must keep either the high card or the gap fixed.')
+        kind = kind1
+
+    elif entry.endswith('+'):
+        hi, lo, kind = _hand_class(entry[:-1])
+        if hi == lo:
+            classes = [(r, r) for r in range(hi, 13)]
+        else:
+            classes = [(hi, r) for r in range(lo, hi)]
+
+    else:
+        hi, lo, kind = _hand_class(entry)
+        classes = [(hi, lo)]
+
+    combos = []
+    for hi, lo in classes:
+        for s1 in range(4):
+            for s2 in range(4):
+                if hi == lo and s2 <= s1:
+                    continue
+                if hi != lo and ((kind == 's' and s1 != s2) or (kind == 'o' and s1 == s2)):
+                    continue
+                combos.append(COMBO_INDEX[s1 * 13 + hi, s2 * 13 + lo])
+
+    return combos
+
+
+def _hand_class(text):
+    """High rank, low rank and kind ('s', 'o' or '' for both) of e.g. 'AKs' or 'TT'"""
+
+    if len(text) not in (2, 3):
+        raise ValueError('Not a hand class.')
+
+    hi, lo = RANK_CHARS.index(text[0].upper()), RANK_CHARS.index(text[1].upper())
+    kind = text[2].lower() if len(text) == 3 else ''
+    if kind not in ('', 's', 'o') or (hi == lo and kind):
+        raise ValueError('Not a hand class.')
+
+    return max(hi, lo), min(hi, lo), kind
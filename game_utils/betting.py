@@ -0,0 +1,350 @@
+"""
+Table-driven no-limit betting state machine.
+
+Every per-seat quantity lives in a list that is allocated once per table, and
+the seats that can still act are kept in a circular linked list, so both
+legal_actions() and apply() run in constant time without allocating. Street
+transitions are the only O(number of players) steps.
+"""
+
+import numpy as np
+
+# Actions. CALL is a check when there is nothing to call, and RAISE is a bet when
+# nobody has bet yet. A RAISE amount is the total the seat raises to on this street
+FOLD = 0
+CALL = 1
+RAISE = 2
+
+FOLD_BIT = 1 << FOLD
+CALL_BIT = 1 << CALL
+RAISE_BIT = 1 << RAISE
+
+# Seat status, as reported in the state vector
+ACTIVE = 0
+FOLDED = 1
+ALL_IN = 2
+
+STREETS = ['preflop', 'flop', 'turn', 'river']
+
+# Scalar fields at the start of a snapshot, followed by the per-seat lists
+_SNAPSHOT_SCALARS = ('button', 'big_blind', 'street', 'to_act', 'current_bet', 'min_raise', 'raise_count',
+                     'pending', 'n_active', 'n_live', 'street_closed', 'hand_over')
+_SNAPSHOT_LISTS = ('stacks', 'street_bets', 'total_bets', 'status', 'acted_at', '_next', '_prev')
+
+
+class BettingStateMachine:
+
+    __slots__ = ('n_players',) + _SNAPSHOT_SCALARS + _SNAPSHOT_LISTS + ('_vector',)
+
+    def __init__(self, n_players):
+        """
+
+        Args:
+            n_players (int): number of seats at the table
+        """
+
+        self.n_players = n_players
+
+        self.stacks = [0] * n_players
+        self.street_bets = [0] * n_players
+        self.total_bets = [0] * n_players
+        self.status = [ACTIVE] * n_players
+
+        # The raise count at each seat's last action on this street. A seat may only
+        # raise again once a full raise has happened since it last acted
+        self.acted_at = [-1] * n_players
+
+        # Circular linked list of the seats that can still act
+        self._next = [0] * n_players
+        self._prev = [0] * n_players
+
+        self.button = 0
+        self.big_blind = 0
+        self.street = 0
+        self.to_act = 0
+        self.current_bet = 0
+        self.min_raise = 0
+        self.raise_count = 0
+        self.pending = 0
+        self.n_active = 0
+        self.n_live = 0
+        self.street_closed = False
+        self.hand_over = False
+
+        # [street, to_act, current_bet, min_raise, pot, pending] followed by the
+        # stacks, street bets, total bets and status of every seat
+        self._vector = np.zeros(6 + 4 * n_players, dtype=np.int64)
+
+    def start_hand(self, stacks, button, small_blind_position, big_blind_position, small_blind, big_blind):
+        """Resets the table for a new hand and posts the blinds
+
+        Seats with an empty stack are dealt out of the hand.
+
+        Args:
+            stacks (list): chips of every seat before the blinds
+            button (int): seat of the button
+            small_blind_position (int): seat posting the small blind
+            big_blind_position (int): seat posting the big blind
+            small_blind (int): size of the small blind
+            big_blind (int): size of the big blind
+        """
+
+        n = self.n_players
+        self.button = button
+        self.big_blind = big_blind
+        self.street = 0
+        self.raise_count = 0
+        self.hand_over = False
+
+        for i in range(n):
+            self.stacks[i] = stacks[i]
+            self.street_bets[i] = 0
+            self.total_bets[i] = 0
+            self.acted_at[i] = -1
+            self.status[i] = ACTIVE if stacks[i] > 0 else FOLDED
+
+        self._relink()
+        self.n_live = sum(1 for s in self.status if s != FOLDED)
+
+        self._commit(seat=small_blind_position, amount=min(small_blind, self.stacks[small_blind_position]))
+        self._commit(seat=big_blind_position, amount=min(big_blind, self.stacks[big_blind_position]))
+
+        self.current_bet = max(self.street_bets)
+        self.min_raise = big_blind
+
+        self._open_street(first=big_blind_position)
+
+    def next_street(self):
+        """Moves on to the next street once the current one is closed"""
+
+        if not self.street_closed or self.hand_over:
+            raise ValueError('The current street is still open or the hand is over.')
+
+        self.street += 1
+        self.raise_count = 0
+        self.current_bet = 0
+        self.min_raise = self.big_blind
+        for i in range(self.n_players):
+            self.street_bets[i] = 0
+            self.acted_at[i] = -1
+
+        self._open_street(first=self.button)
+
+    def legal_actions(self):
+        """Bitmask of the legal actions of the seat to act (FOLD_BIT, CALL_BIT, RAISE_BIT)"""
+
+        seat = self.to_act
+        to_call = self.current_bet - self.street_bets[seat]
+
+        legal = CALL_BIT
+        if to_call > 0:
+            legal |= FOLD_BIT
+        if self.stacks[seat] > to_call and self.acted_at[seat] != self.raise_count:
+            legal |= RAISE_BIT
+
+        return legal
+
+    def to_call(self):
+        """Chips the seat to act needs to put in to call"""
+        return min(self.current_bet - self.street_bets[self.to_act], self.stacks[self.to_act])
+
+    def min_raise_to(self):
+        """Smallest legal raise-to amount, which may be an all-in for less"""
+        return min(self.current_bet + self.min_raise, self.max_raise_to())
+
+    def max_raise_to(self):
+        """Largest legal raise-to amount, i.e. all-in"""
+        return self.street_bets[self.to_act] + self.stacks[self.to_act]
+
+    def apply(self, action, amount=0):
+        """Applies the action of the seat to act and moves the turn on
+
+        Args:
+            action (int): FOLD, CALL or RAISE
+            amount (int): for RAISE, the total street bet to raise to
+
+        Returns:
+            the chips the seat put in with this action
+        """
+
+        seat = self.to_act
+        legal = self.legal_actions()
+        if not legal >> action & 1:
+            raise ValueError('Action {} is not legal for seat {}.'.format(action, seat))
+
+        put_in = 0
+
+        if action == FOLD:
+            self.status[seat] = FOLDED
+            self.n_live -= 1
+            self._unlink(seat=seat)
+            self.pending -= 1
+
+        elif action == CALL:
+            put_in = min(self.current_bet - self.street_bets[seat], self.stacks[seat])
+            self._commit(seat=seat, amount=put_in)
+            self.pending -= 1
+
+        else:
+            if not self.min_raise_to() <= amount <= self.max_raise_to():
+                raise ValueError('Raise to {} is outside of [{}, {}].'.format(
+                    amount, self.min_raise_to(), self.max_raise_to()))
+
+            # Only a full raise reopens the betting for seats that already acted
+            increment = amount - self.current_bet
+            if increment >= self.min_raise:
+                self.min_raise = increment
+                self.raise_count += 1
+
+            put_in = amount - self.street_bets[seat]
+            self.current_bet = amount
+            self._commit(seat=seat, amount=put_in)
+
+            # Everybody else who can still act has to respond
+            self.pending = self.n_active - (1 if self.status[seat] == ACTIVE else 0)
+
+        self.acted_at[seat] = self.raise_count
+
+        if self.n_live == 1:
+            self.street_closed = True
+            self.hand_over = True
+        elif self.pending <= 0:
+            self.street_closed = True
+            self.hand_over = self.street == 3
+        else:
+            self.to_act = self._next[seat]
+
+        return put_in
+
+    def state_vector(self):
+        """Compact integer encoding of the full betting state
+
+        The same preallocated array is filled in and returned on every call, so
+        copy it if it needs to outlive the next call.
+
+        Returns:
+            np.ndarray of [street, to_act, current_bet, min_raise, pot, pending]
+            followed by the stacks, street bets, total bets and status of every seat
+        """
+
+        n = self.n_players
+        v = self._vector
+        v[0] = self.street
+        v[1] = self.to_act
+        v[2] = self.current_bet
+        v[3] = self.min_raise
+        v[4] = sum(self.total_bets)
+        v[5] = self.pending
+        v[6:6 + n] = self.stacks
+        v[6 + n:6 + 2 * n] = self.street_bets
+        v[6 + 2 * n:6 + 3 * n] = self.total_bets
+        v[6 + 3 * n:] = self.status
+
+        return v
+
+    @staticmethod
+    def snapshot_size(n_players):
+        """Length of a snapshot of a table with n_players seats"""
+        return len(_SNAPSHOT_SCALARS) + len(_SNAPSHOT_LISTS) * n_players
+
+    def snapshot(self, out=None):
+        """Writes the full betting state into a flat int64 array
+
+        Unlike state_vector() this keeps everything apply() depends on, including
+        the linked list of seats, so restore() puts the machine back exactly.
+
+        Args:
+            out (np.ndarray): optional int64 array of length snapshot_size() to fill
+
+        Returns:
+            the filled array
+        """
+
+        n = self.n_players
+        if out is None:
+            out = np.empty(self.snapshot_size(n_players=n), dtype=np.int64)
+
+        k = len(_SNAPSHOT_SCALARS)
+        for i, name in enumerate(_SNAPSHOT_SCALARS):
+            out[i] = getattr(self, name)
+        for name in _SNAPSHOT_LISTS:
+            out[k:k + n] = getattr(self, name)
+            k += n
+
+        return out
+
+    def restore(self, state):
+        """Puts the machine back to a snapshot taken with snapshot()"""
+
+        n = self.n_players
+        values = state.tolist()
+
+        k = len(_SNAPSHOT_SCALARS)
+        for i, name in enumerate(_SNAPSHOT_SCALARS):
+            setattr(self, name, values[i])
+        self.street_closed = bool(self.street_closed)
+        self.hand_over = bool(self.hand_over)
+
+        for name in _SNAPSHOT_LISTS:
+            getattr(self, name)[:] = values[k:k + n]
+            k += n
+
+    def _open_street(self, first):
+        """Sets the first seat to act after `first` and how many seats need to act"""
+
+        self.street_closed = False
+        self.pending = self.n_active
+
+        # A lone seat that can still act only has to act when facing a bet
+        if self.n_active == 1:
+            seat = self._first_active_after(seat=first)
+            if self.street_bets[seat] >= self.current_bet:
+                self.pending = 0
+
+        if self.pending == 0:
+            self.street_closed = True
+            self.hand_over = self.street == 3 or self.n_live == 1
+            return
+
+        self.to_act = self._first_active_after(seat=first)
+
+    def _first_active_after(self, seat):
+        """First seat after `seat`, going clockwise, that can still act"""
+
+        for offset in range(1, self.n_players + 1):
+            s = (seat + offset) % self.n_players
+            if self.status[s] == ACTIVE:
+                return s
+
+        return seat
+
+    def _commit(self, seat, amount):
+        """Moves chips from a seat's stack into its bets"""
+
+        self.stacks[seat] -= amount
+        self.street_bets[seat] += amount
+        self.total_bets[seat] += amount
+
+        if self.stacks[seat] == 0 and self.status[seat] == ACTIVE:
+            self.status[seat] = ALL_IN
+            self._unlink(seat=seat)
+
+    def _relink(self):
+        """Rebuilds the linked list of seats that can act from the status list"""
+
+        active = [i for i in range(self.n_players) if self.status[i] == ACTIVE]
+        self.n_active = len(active)
+
+        for i, seat in enumerate(active):
+            self._next[seat] = active[(i + 1) % len(active)]
+            self._prev[seat] = active[i - 1]
+
+    def _unlink(self, seat):
+        """Takes a seat out of the linked list. Its own pointers are left intact, so
+        the turn can still move on from it"""
+
+        nxt = self._next[seat]
+        prev = self._prev[seat]
+        self._next[prev] = nxt
+        self._prev[nxt] = prev
+        self.n_active -= 1
@@ -2,7 +2,12 @@
 
 """
 
-import numpy as np
+from game_utils.betting import FOLD, STREETS, BettingStateMachine
+from game_utils.pots import PotLedger
+from game_utils.state import (BIG_BLIND_POSITION, BOARD, BOARD_LEN, BUTTON, HAS_LEDGER, ROUND,
+                              SMALL_BLIND_POSITION, GameState)
+from interpreter.engine import InterpreterEngine
+
 
 class Game:
 
@@ -10,50 +15,51 @@ class Game:
 
     """
 
-    def __init__(self, deck, board, small_blind):
+    __slots__ = ('deck', 'board', 'small_blind', 'engine', 'players', 'remaining_players', 'ledger', 'betting',
+                 'button_position', 'current_betting_round', 'small_blind_position', 'big_blind_position')
+
+    def __init__(self, deck, board, small_blind, engine=None):
 
         self.deck = deck
         self.board = board
         self.small_blind = small_blind
+        self.engine = engine if engine is not None else InterpreterEngine()
         self.players = None
         self.remaining_players = None
-        self.current_pot = 0
+        self.ledger = None
+        self.betting = None
         self.button_position = None
         self.current_betting_round = None
-        self.remaining_players = None
         self.small_blind_position = None
         self.big_blind_position = None
 
-
     def add_players(self, players):
         """"""
 
         self.players = players
-        self.button_position = np.random.choice([x for x in range(len(self.players))])
+        self.button_position = int(self.deck.rng.integers(len(self.players)))
+        self._set_blind_positions()
+        self.betting = BettingStateMachine(n_players=len(self.players))
 
     def deal_hand(self):
         """"""
 
-        # (0) Shuffling our deck
+        # (0) Shuffling our deck and clearing the board and pots from the last hand
         self.deck.shuffle()
+        self.board.clear()
+        self.ledger = PotLedger(n_players=len(self.players))
+        for p in self.players:
+            p.new_hand()
 
-        # (1) Looping through each player and giving them one card
-        # We accomplish this by creating a list of empty hand dictionaries
-        dealt_cards = [
-            {
-                'cards': [],
-                'suits': []
-            }
-            for _ in range(len(self.players))
-        ]
+        # (1) Looping through each player and giving them one card at a time
+        # Each hand is simply a list of card codes (see card_utils.cards)
+        dealt_cards = [[] for _ in range(len(self.players))]
 
         for _ in range(2):
             for i in range(len(self.players)):
-                suit, card = self.deck.draw_card()
-                dealt_cards[i]['cards'].append(card)
-                dealt_cards[i]['suits'].append(suit)
+                dealt_cards[i].append(self.deck.draw_card())
 
-        # Here, we have a list of hand dictionaries
+        # Here, we have a list of hands
         # Now, we can simply loop through them and assign them to each of the
         # game's players
         for i in range(len(dealt_cards)):
@@ -62,117 +68,229 @@ class Game:
     def deal_flop(self):
         """"""
         for _ in range(3):
-            suit, card = self.deck.draw_card()
-            self.board.add_card(suit=suit, card=card)
+            self.board.add_card(card=self.deck.draw_card())
 
     def deal_turn(self):
         """"""
-        suit, card = self.deck.draw_card()
-        self.board.add_card(suit=suit, card=card)
+        self.board.add_card(card=self.deck.draw_card())
 
     def deal_river(self):
         """"""
-        suit, card = self.deck.draw_card()
-        self.board.add_card(suit=suit, card=card)
+        self.board.add_card(card=self.deck.draw_card())
 
     def betting_round(self):
+        """Plays out the betting of the current street
+
+        Every player is asked for an action in turn until the betting state
+        machine closes the street. The chips each action puts in are taken from
+        the player's stack and recorded in the pot ledger.
+        """
+
+        while not self.betting.street_closed:
+            seat = self.betting.to_act
+            player = self.players[seat]
+
+            action, amount = player.act(betting=self.betting)
+            put_in = self.betting.apply(action=action, amount=amount)
+
+            if action == FOLD:
+                player.fold()
+                self.remaining_players.remove(seat)
+            elif put_in:
+                self.ledger.add(player=seat, amount=player.bet(amount=put_in))
+
+    def post_blinds(self):
+        """Starts the hand in the betting state machine and collects the blinds"""
+
+        self.betting.start_hand(stacks=[p.chips for p in self.players],
+                                button=self.button_position,
+                                small_blind_position=self.small_blind_position,
+                                big_blind_position=self.big_blind_position,
+                                small_blind=self.small_blind,
+                                big_blind=self.small_blind * 2)
+
+        for seat in (self.small_blind_position, self.big_blind_position):
+            posted = self.betting.street_bets[seat]
+            if posted:
+                self.ledger.add(player=seat, amount=self.players[seat].bet(amount=posted))
+
+    def move_button(self):
+        """A simple method that moves the position of the button, and the
+        blinds along with it. Heads-up, the button posts the small blind
+        """
+
+        self.button_position = (self.button_position + 1) % len(self.players)
+        self._set_blind_positions()
+
+    def _set_blind_positions(self):
         """"""
 
-        # If we are preflop, each player gets a chance, starting with the UTG
-        # position, which is ultimately 3 spots ahead of the button player
-        if self.current_betting_round == 'preflop':
+        if len(self.players) == 2:
+            self.small_blind_position = self.button_position
+        else:
+            self.small_blind_position = (self.button_position + 1) % len(self.players)
+
+        self.big_blind_position = (self.small_blind_position + 1) % len(self.players)
 
-            # Pulling out the blinds
-            small_b = self.players[self.small_blind_position].bet(amount=self.small_blind)
-            big_b = self.players[self.big_blind_position].bet(amount=self.small_blind * 2)
-            self.current_pot += small_b
-            self.current_pot += big_b
+    def snapshot(self, out=None):
+        """Captures the whole table in one flat GameState
 
-            # Declaring the first betting position
-            if self.big_blind_position == len(self.players):
-                current_bettor = 0
-            else:
-                current_bettor = self.big_blind_position + 1
+        Only slices of preallocated arrays are written, so passing the same
+        `out` back in on every call makes branching allocation-free. Policies,
+        the engine and the blind sizes are not part of the state.
 
-            current_num_bets = 0
+        Args:
+            out (GameState): optional state of the same table size to fill
 
-            while current_num_bets <= len(self.remaining_players):
-                self.players[current_bettor].bet()
-                current_num_bets += 1
-                if current_bettor == len(self.players):
-                    current_bettor = 0
-                else:
-                    current_bettor += 1
+        Returns:
+            GameState
+        """
 
+        n = len(self.players)
+        state = out if out is not None else GameState(n_players=n)
 
-        if self.current_betting_round == 'flop':
-            pass
+        header = state.header
+        header[BUTTON] = self.button_position
+        header[SMALL_BLIND_POSITION] = self.small_blind_position
+        header[BIG_BLIND_POSITION] = self.big_blind_position
+        header[ROUND] = (STREETS.index(self.current_betting_round)
+                                if self.current_betting_round is not None else -1)
+        header[HAS_LEDGER] = self.ledger is not None
+        header[BOARD_LEN] = len(self.board.cards)
+        header[BOARD:BOARD + len(self.board.cards)] = self.board.cards
 
-        if self.current_betting_round == 'turn':
-            pass
+        self.deck.snapshot(out=state.deck)
 
-        if self.current_betting_round == 'river':
-            pass
+        for i, p in enumerate(self.players):
+            state.chips[i] = p.chips
+            state.folded[i] = p.folded
+            state.all_in[i] = p.all_in
+            state.hole_cards[2 * i:2 * i + 2] = p.current_hand if p.current_hand is not None else (-1, -1)
 
-        pass
+        state.remaining[:] = 0
+        if self.remaining_players is not None:
+            state.remaining[self.remaining_players] = 1
 
-    def move_button(self):
-        """A simple method that moves the position of the button.
-        The one check deals with the inconvenience of a finite number of
-        players
+        if self.ledger is not None:
+            state.contributions[:] = self.ledger.contributions
+            state.ledger_folded[:] = self.ledger.folded
+
+        self.betting.snapshot(out=state.betting)
+
+        return state
+
+    def restore(self, state):
+        """Puts the table back to a GameState taken with snapshot()
+
+        Args:
+            state (GameState): a snapshot of this table
         """
 
-        if self.button_position == len(self.players):
-            self.button_position = 0
-        else:
-            self.button_position += 1
+        if state.n_players != len(self.players):
+            raise ValueError('Snapshot is for {} players, not {}.'.format(state.n_players, len(self.players)))
 
-        if self.button_position == len(self.players):
-            self.small_blind_position = 0
-        else:
-            self.small_blind_position += 1
+        header = state.header.tolist()
+        self.button_position = header[BUTTON]
+        self.small_blind_position = header[SMALL_BLIND_POSITION]
+        self.big_blind_position = header[BIG_BLIND_POSITION]
+        self.current_betting_round = STREETS[header[ROUND]] if header[ROUND] >= 0 else None
+
+        self.board.clear()
+        for card in header[BOARD:BOARD + header[BOARD_LEN]]:
+            self.board.add_card(card=card)
+
+        self.deck.restore(state=state.deck)
+
+        chips = state.chips.tolist()
+        hole_cards = state.hole_cards.tolist()
+        for i, p in enumerate(self.players):
+            p.chips = chips[i]
+            p.folded = bool(state.folded[i])
+            p.all_in = bool(state.all_in[i])
+            p.current_hand = hole_cards[2 * i:2 * i + 2] if hole_cards[2 * i] >= 0 else None
 
-        if self.small_blind_position == len(self.players):
-            self.big_blind_position = 0
+        self.remaining_players = [i for i, r in enumerate(state.remaining.tolist()) if r]
+
+        if header[HAS_LEDGER]:
+            if self.ledger is None:
+                self.ledger = PotLedger(n_players=len(self.players))
+            self.ledger.contributions[:] = state.contributions.tolist()
+            self.ledger.folded[:] = [bool(f) for f in state.ledger_folded.tolist()]
         else:
-            self.big_blind_position += 1
+            self.ledger = None
 
+        self.betting.restore(state=state.betting)
 
+    @property
+    def current_pot(self):
+        """Every chip in the middle, across the main pot and side pots"""
+        return self.ledger.total if self.ledger is not None else 0
 
     def hand_completion(self):
-        """"""
-        pass
+        """Resolves the main pot and every side pot and pays out the winners
+
+        All of the pots are awarded from one showdown ranking of the players that
+        are still in the hand, so this stays linear in the number of players.
+
+        Returns:
+            list with the chips won by each seat
+        """
+
+        for i, p in enumerate(self.players):
+            if p.folded:
+                self.ledger.fold(player=i)
+
+        live = [i for i, p in enumerate(self.players) if not p.folded]
+        showdown_ranks = [None] * len(self.players)
+
+        if len(live) == 1:
+            showdown_ranks[live[0]] = 0
+        else:
+            ranks = self.engine.rank_players(
+                hands=[self.players[i].current_hand for i in live],
+                board=self.board.mask
+            )
+            for i, r in zip(live, ranks):
+                showdown_ranks[i] = r
+
+        payouts = self.ledger.award(showdown_ranks=showdown_ranks, button=self.button_position)
+        for p, won in zip(self.players, payouts):
+            p.chips += won
+
+        return payouts
 
     def play_hand(self):
-        """"""
+        """Plays one full hand, from the deal to paying out the pots
+
+        Returns:
+            list with the chips won by each seat
+        """
 
         # (0) Dealing cards/resetting remaining players index
         self.deal_hand()
-        self.remaining_players = [x for x in range(len(self.players))]
+        self.remaining_players = [x for x in range(len(self.players)) if not self.players[x].folded]
 
         # (1) Facilitating a betting round
         self.current_betting_round = 'preflop'
+        self.post_blinds()
+        self.betting_round()
 
-        # (2) Dealing the flop
-        self.deal_flop()
-        self.current_betting_round = 'flop'
-
-        # (3) Facilitating a betting round
-
-        # (4) Dealing the turn
-        self.deal_turn()
-        self.current_betting_round = 'turn'
-
-        # (5) Facilitating a betting round
-
-        # (6) Dealing the river
-        self.deal_river()
-        self.current_betting_round = 'river'
+        # (2) - (7) Dealing the flop, turn and river, each followed by a betting
+        # round. Once everyone left is all-in, the streets close immediately and
+        # the board simply runs out
+        for street, deal in [('flop', self.deal_flop), ('turn', self.deal_turn), ('river', self.deal_river)]:
+            if self.betting.hand_over:
+                break
 
-        # (7) Facilitating a betting round
+            deal()
+            self.current_betting_round = street
+            self.betting.next_street()
+            self.betting_round()
 
         # (9) Finishing up the hands
+        payouts = self.hand_completion()
 
         # (10) Moving the button
         self.move_button()
 
+        return payouts
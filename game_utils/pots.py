@@ -0,0 +1,101 @@
+"""
+Main pot and side pot bookkeeping.
+"""
+
+
+class PotLedger:
+
+    __slots__ = ('contributions', 'folded')
+
+    def __init__(self, n_players):
+        """Tracks how many chips every seat has put into the pot this hand
+
+        Args:
+            n_players (int): number of seats at the table
+        """
+
+        self.contributions = [0] * n_players
+        self.folded = [False] * n_players
+
+    @property
+    def total(self):
+        """Every chip in the middle, across all pots"""
+        return sum(self.contributions)
+
+    def add(self, player, amount):
+        """Records chips put in by a seat"""
+        self.contributions[player] += amount
+
+    def fold(self, player):
+        """A folded seat's chips stay in the pots, but it can no longer win any"""
+        self.folded[player] = True
+
+    def build_pots(self):
+        """Splits the contributions into the main pot and the side pots
+
+        Each distinct contribution level of a seat that is still in the hand caps
+        one pot. A pot holds every seat's chips between the previous level and its
+        own, and the seats that reached its level are eligible to win it.
+
+        Returns:
+            list of (amount, eligible seats) tuples, main pot first
+        """
+
+        n = len(self.contributions)
+        order = sorted(range(n), key=lambda i: self.contributions[i])
+
+        pots = []
+        previous = 0
+        # Chips in the middle capped at the previous level, i.e. already in earlier pots
+        previous_capped = 0
+        # Sum of the contributions sorted before the current position
+        prefix = 0
+        for position, seat in enumerate(order):
+            level = self.contributions[seat]
+
+            if not self.folded[seat] and level > previous:
+                capped = prefix + level * (n - position)
+                eligible = [s for s in order[position:] if not self.folded[s]]
+
+                pots.append((capped - previous_capped, sorted(eligible)))
+                previous = level
+                previous_capped = capped
+
+            prefix += level
+
+        # Chips from folded seats above the last live level go to the last pot
+        leftover = self.total - sum(p[0] for p in pots)
+        if leftover and pots:
+            pots[-1] = (pots[-1][0] + leftover, pots[-1][1])
+
+        return pots
+
+    def award(self, showdown_ranks, button=0):
+        """Awards every pot to the best eligible hands
+
+        Tied seats split a pot evenly. The odd chips are handed out one at a time
+        starting from the first tied seat to the left of the button, so the split
+        is deterministic.
+
+        Args:
+            showdown_ranks (list): dense showdown rank of each seat, 0 being the
+                best hand (see InterpreterEngine.rank_players). Folded seats are ignored
+            button (int): seat of the button
+
+        Returns:
+            list with the chips won by each seat
+        """
+
+        n = len(self.contributions)
+        payouts = [0] * n
+
+        for amount, eligible in self.build_pots():
+            best = min(showdown_ranks[s] for s in eligible)
+            winners = [s for s in eligible if showdown_ranks[s] == best]
+            winners.sort(key=lambda s: (s - button - 1) % n)
+
+            share, odd_chips = divmod(amount, len(winners))
+            for i, s in enumerate(winners):
+                payouts[s] += share + (1 if i < odd_chips else 0)
+
+        return payouts
@@ -0,0 +1,77 @@
+"""
+Flat, snapshot-able game state.
+
+A GameState is one preallocated int64 array holding everything needed to put a
+Game back exactly where it was: the deck order and draw position, the board,
+every player's stack and hole cards, the pot ledger and the betting state
+machine. Taking or restoring a snapshot is a handful of slice copies, so tree
+search and rollouts can branch and undo a hand without any deepcopy.
+"""
+
+import numpy as np
+
+from card_utils.deck import Deck
+from game_utils.betting import BettingStateMachine
+
+# Fields at the start of the array
+BUTTON = 0
+SMALL_BLIND_POSITION = 1
+BIG_BLIND_POSITION = 2
+# Index of the current betting round in game_utils.betting.STREETS, or -1
+ROUND = 3
+HAS_LEDGER = 4
+BOARD_LEN = 5
+BOARD = 6
+HEADER_SIZE = 11
+
+
+class GameState:
+
+    __slots__ = ('n_players', 'data', 'header', 'deck', 'chips', 'folded', 'all_in', 'hole_cards',
+                 'remaining', 'contributions', 'ledger_folded', 'betting')
+
+    def __init__(self, n_players):
+        """Allocates the array of a table with n_players seats
+
+        The remaining attributes are views into data, one per section, so a
+        section can be read or written without knowing the layout.
+
+        Args:
+            n_players (int): number of seats at the table
+        """
+
+        self.n_players = n_players
+        self.data = np.zeros(self.size_for(n_players), dtype=np.int64)
+
+        n = n_players
+        sections = [
+            ('header', HEADER_SIZE),
+            ('deck', Deck.SNAPSHOT_SIZE),
+            ('chips', n),
+            ('folded', n),
+            ('all_in', n),
+            ('hole_cards', 2 * n),
+            ('remaining', n),
+            ('contributions', n),
+            ('ledger_folded', n),
+            ('betting', BettingStateMachine.snapshot_size(n_players=n))
+        ]
+
+        start = 0
+        for name, size in sections:
+            setattr(self, name, self.data[start:start + size])
+            start += size
+
+    @staticmethod
+    def size_for(n_players):
+        """Length of the array for a table with n_players seats"""
+        return (HEADER_SIZE + Deck.SNAPSHOT_SIZE + 8 * n_players
+                + BettingStateMachine.snapshot_size(n_players=n_players))
+
+    def copy(self):
+        """Independent copy of this snapshot"""
+
+        state = GameState(n_players=self.n_players)
+        state.data[:] = self.data
+
+        return state
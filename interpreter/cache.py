@@ -0,0 +1,78 @@
+"""
+Bounded least-recently-used cache for evaluation and equity results.
+"""
+
+from collections import OrderedDict
+
+
+class LRUCache:
+
+    def __init__(self, max_size):
+        """
+
+        Args:
+            max_size (int): the number of entries kept before the least recently
+                used one is evicted
+        """
+
+        if max_size < 1:
+            raise ValueError('Cache size must be at least 1.')
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Looks up a key, marking it as the most recently used on a hit"""
+
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return value
+
+    def put(self, key, value):
+        """Stores a value, evicting the least recently used entry when full"""
+
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drops every entry and resets the statistics"""
+
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """Hit/miss statistics of the cache"""
+
+        lookups = self.hits + self.misses
+
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,308 @@
+"""
+Lookup-table hand evaluator. Any set of 5, 6 or 7 cards is mapped onto a single
+integer rank in [1, 7462] where a larger rank is a stronger hand, so ties and
+kickers are resolved by nothing more than comparing integers.
+
+Cards are the integer codes of card_utils.cards, `suit * 13 + rank` with rank 0
+(deuce) through 12 (ace). A set of cards is therefore also a bitmask where each
+block of 13 bits holds the ranks present in one suit. The evaluation then comes down to two table lookups:
+    (1) Non-flush hands only depend on the multiset of ranks. Each rank is given
+        the key 5**rank, and since no rank can appear more than 4 times, the sum
+        of the keys is a unique (base-5) fingerprint of the rank histogram
+    (2) Flushes only depend on the 13-bit rank mask of the flush suit
+"""
+
+import numpy as np
+
+from card_utils.cards import POPCOUNT, cards_to_masks
+
+
+class HandEvaluator:
+
+    # The tables are the same for every evaluator, so they are only built once
+    _tables = None
+
+    def __init__(self):
+
+        self.hand_types = [
+            'high card',
+            'one pair',
+            'two pair',
+            'trips',
+            'straight',
+            'flush',
+            'full house',
+            'quads',
+            'straight flush'
+        ]
+
+        if HandEvaluator._tables is None:
+            HandEvaluator._tables = self._build_tables()
+
+        (self.suit_rank_key,
+         self.flush_rank,
+         self.nonflush_keys,
+         self.nonflush_ranks,
+         self.rank_category,
+         self._key_list,
+         self._flush_list,
+         self._nonflush_lookup) = HandEvaluator._tables
+
+    def evaluate(self, cards):
+        """Ranks a single set of 5, 6 or 7 cards
+
+        Args:
+            cards (iterable): integer card codes
+
+        Returns:
+            integer rank of the best 5-card hand, higher is better
+        """
+
+        mask = 0
+        for c in cards:
+            mask |= 1 << c
+
+        return self.evaluate_mask(mask)
+
+    def evaluate_mask(self, mask):
+        """Ranks a single set of cards given as a bitmask
+
+        Args:
+            mask (int): bitmask with bit `code` set for every card in the set
+
+        Returns:
+            integer rank of the best 5-card hand, higher is better
+        """
+
+        d = mask & 0x1FFF
+        h = (mask >> 13) & 0x1FFF
+        s = (mask >> 26) & 0x1FFF
+        c = (mask >> 39) & 0x1FFF
+
+        key = self._key_list[d] + self._key_list[h] + self._key_list[s] + self._key_list[c]
+
+        try:
+            rank = self._nonflush_lookup[key]
+        except KeyError:
+            raise ValueError('Hands must contain between 5 and 7 distinct cards.')
+
+        flush = max(self._flush_list[d], self._flush_list[h], self._flush_list[s], self._flush_list[c])
+
+        return flush if flush > rank else rank
+
+    def evaluate_batch(self, cards):
+        """Ranks many sets of cards at once
+
+        Args:
+            cards (np.ndarray): integer card codes of shape (..., k) with 5 <= k <= 7
+
+        Returns:
+            np.ndarray of ranks with shape (...)
+        """
+
+        return self.evaluate_masks(cards_to_masks(cards))
+
+    def evaluate_masks(self, masks):
+        """Ranks many sets of cards given as bitmasks
+
+        Args:
+            masks (np.ndarray): int64 card bitmasks of any shape, each with 5 to 7 cards
+
+        Returns:
+            np.ndarray of ranks with the same shape as masks
+        """
+
+        masks = np.asarray(masks, dtype=np.int64)
+        keys = np.zeros(masks.shape, dtype=np.int64)
+        flush = np.zeros(masks.shape, dtype=np.int16)
+
+        for suit in range(4):
+            suit_mask = (masks >> (13 * suit)) & 0x1FFF
+            keys += self.suit_rank_key[suit_mask]
+            np.maximum(flush, self.flush_rank[suit_mask], out=flush)
+
+        idx = np.searchsorted(self.nonflush_keys, keys)
+        np.minimum(idx, len(self.nonflush_keys) - 1, out=idx)
+
+        # Only histograms of 5 to 7 cards are in the table
+        if (self.nonflush_keys[idx] != keys).any():
+            raise ValueError('Hands must contain between 5 and 7 distinct cards.')
+
+        return np.maximum(self.nonflush_ranks[idx], flush)
+
+    def evaluate_runouts(self, base_masks, runout_masks):
+        """Ranks every combination of a set of partial hands and a set of runouts
+
+        The non-flush fingerprint is additive over disjoint cards, so the partial
+        hands (e.g. hole cards plus the flop) and the runouts are each reduced to
+        their fingerprints once, and every combination then costs one addition
+        instead of a full re-evaluation. Flushes are only looked up for suits in
+        which a flush is still reachable.
+
+        Args:
+            base_masks (np.ndarray): (P,) bitmasks of the partial hands
+            runout_masks (np.ndarray): (R,) bitmasks of the cards to add, disjoint
+                from every partial hand, so that each combination has 5 to 7 cards
+
+        Returns:
+            (R, P) np.ndarray of ranks
+        """
+
+        base_masks = np.asarray(base_masks, dtype=np.int64)
+        runout_masks = np.asarray(runout_masks, dtype=np.int64)
+
+        base_keys = np.zeros(base_masks.shape, dtype=np.int64)
+        runout_keys = np.zeros(runout_masks.shape, dtype=np.int64)
+        base_suits = []
+        runout_suits = []
+        for suit in range(4):
+            base_suits.append((base_masks >> (13 * suit)) & 0x1FFF)
+            runout_suits.append((runout_masks >> (13 * suit)) & 0x1FFF)
+            base_keys += self.suit_rank_key[base_suits[-1]]
+            runout_keys += self.suit_rank_key[runout_suits[-1]]
+
+        keys = runout_keys[:, None] + base_keys
+        idx = np.searchsorted(self.nonflush_keys, keys)
+        np.minimum(idx, len(self.nonflush_keys) - 1, out=idx)
+
+        # Only histograms of 5 to 7 cards are in the table
+        if (self.nonflush_keys[idx] != keys).any():
+            raise ValueError('Hands must contain between 5 and 7 distinct cards.')
+
+        ranks = self.nonflush_ranks[idx]
+
+        for suit in range(4):
+            if POPCOUNT[base_suits[suit]].max() + POPCOUNT[runout_suits[suit]].max() < 5:
+                continue
+            np.maximum(ranks, self.flush_rank[runout_suits[suit][:, None] | base_suits[suit]], out=ranks)
+
+        return ranks
+
+    def hand_type(self, rank):
+        """Translates a rank back into the name of its hand category"""
+        return self.hand_types[self.rank_category[rank]]
+
+    def _build_tables(self):
+        """Enumerates every rank histogram and flush mask and scores them
+
+        The raw scores pack (category, tie-breaking ranks) into one integer. These
+        are then compressed into dense ranks using the 7462 distinct 5-card hands.
+
+        Returns:
+            tuple of lookup tables
+        """
+
+        # (0) Key of each 13-bit rank mask for the non-flush fingerprint
+        rank_keys = 5 ** np.arange(13, dtype=np.int64)
+        bits = (np.arange(8192)[:, None] >> np.arange(13)) & 1
+        suit_rank_key = bits @ rank_keys
+        popcounts = bits.sum(axis=1)
+
+        # (1) Flushes, scored directly from the rank mask of the flush suit
+        flush_scores = np.zeros(8192, dtype=np.int64)
+        for mask in np.flatnonzero(popcounts >= 5):
+            flush_scores[mask] = self._score_flush(ranks=[r for r in range(12, -1, -1) if mask >> r & 1])
+
+        # (2) Non-flush hands, scored from every histogram of 5 to 7 ranks
+        histograms = []
+        self._enumerate_histograms(counts=[], remaining=7, out=histograms)
+
+        nonflush_keys = np.array(histograms, dtype=np.int64) @ rank_keys
+        nonflush_scores = np.array([self._score_ranks(counts=h) for h in histograms], dtype=np.int64)
+        sizes = np.array(histograms).sum(axis=1)
+
+        # (3) Every 6 and 7 card hand plays as one of the 5-card hands, so the
+        # 5-card scores define the full ordering
+        five_card_scores = np.unique(np.concatenate([
+            nonflush_scores[sizes == 5],
+            flush_scores[popcounts == 5]
+        ]))
+
+        flush_rank = np.zeros(8192, dtype=np.int16)
+        flush_rank[popcounts >= 5] = np.searchsorted(five_card_scores, flush_scores[popcounts >= 5]) + 1
+
+        order = np.argsort(nonflush_keys)
+        nonflush_keys = nonflush_keys[order]
+        nonflush_ranks = (np.searchsorted(five_card_scores, nonflush_scores[order]) + 1).astype(np.int16)
+
+        # Rank 0 is never produced, but it keeps the table aligned with the ranks
+        rank_category = np.concatenate([[0], five_card_scores >> 20]).astype(np.int8)
+
+        # Plain python containers are much faster than numpy for one-off lookups
+        nonflush_lookup = dict(zip(nonflush_keys.tolist(), nonflush_ranks.tolist()))
+
+        return (suit_rank_key, flush_rank, nonflush_keys, nonflush_ranks, rank_category,
+                suit_rank_key.tolist(), flush_rank.tolist(), nonflush_lookup)
+
+    def _enumerate_histograms(self, counts, remaining, out):
+        """Recursively lists every rank histogram (max 4 per rank) of 5 to 7 cards"""
+
+        if len(counts) == 13:
+            if sum(counts) >= 5:
+                out.append(tuple(counts))
+            return
+
+        for n in range(min(4, remaining) + 1):
+            self._enumerate_histograms(counts=counts + [n], remaining=remaining - n, out=out)
+
+    def _pack(self, category, ranks):
+        """Packs a category and up to 5 tie-breaking ranks into one integer"""
+
+        score = category
+        for i in range(5):
+            score = (score << 4) | (ranks[i] if i < len(ranks) else 0)
+
+        return score
+
+    def _straight_high(self, ranks):
+        """Returns the high card of the best straight within the ranks, or None"""
+
+        present = set(ranks)
+        for high in range(12, 3, -1):
+            if all(r in present for r in range(high - 4, high + 1)):
+                return high
+
+        # The wheel, where the ace plays low
+        if {12, 0, 1, 2, 3} <= present:
+            return 3
+
+        return None
+
+    def _score_flush(self, ranks):
+        """Scores the best flush or straight flush from a descending list of suited ranks"""
+
+        high = self._straight_high(ranks=ranks)
+        if high is not None:
+            return self._pack(category=8, ranks=[high])
+
+        return self._pack(category=5, ranks=ranks[:5])
+
+    def _score_ranks(self, counts):
+        """Scores the best non-flush 5-card hand from a rank histogram"""
+
+        ranks = [r for r in range(12, -1, -1) if counts[r]]
+        quads = [r for r in ranks if counts[r] == 4]
+        trips = [r for r in ranks if counts[r] == 3]
+        pairs = [r for r in ranks if counts[r] == 2]
+
+        if quads:
+            return self._pack(category=7, ranks=[quads[0], [r for r in ranks if r != quads[0]][0]])
+
+        if trips and len(trips) + len(pairs) > 1:
+            return self._pack(category=6, ranks=[trips[0], max(trips[1:] + pairs)])
+
+        high = self._straight_high(ranks=ranks)
+        if high is not None:
+            return self._pack(category=4, ranks=[high])
+
+        if trips:
+            return self._pack(category=3, ranks=[trips[0]] + [r for r in ranks if r != trips[0]][:2])
+
+        if len(pairs) > 1:
+            kicker = [r for r in ranks if r not in pairs[:2]][0]
+            return self._pack(category=2, ranks=pairs[:2] + [kicker])
+
+        if pairs:
+            return self._pack(category=1, ranks=[pairs[0]] + [r for r in ranks if r != pairs[0]][:3])
+
+        return self._pack(category=0, ranks=ranks[:5])
@@ -4,36 +4,84 @@
 
 import numpy as np
 
+from game_utils.betting import CALL
+
 
 class Player:
     """
 
     """
 
+    __slots__ = ('chips', 'policy', 'current_hand', 'folded', 'all_in')
+
     def __init__(self,
-                 chips):
+                 chips,
+                 policy=None):
+        """
+
+        Args:
+            chips (int): starting stack
+            policy (callable): decides the player's actions, called as
+                policy(player, betting) with the table's BettingStateMachine and
+                returning an (action, amount) pair. Without one, the player
+                always checks or calls
+        """
         self.chips = chips
+        self.policy = policy
         self.current_hand = None
+        self.folded = False
+        self.all_in = False
+
+    def act(self, betting):
+        """Chooses an action for the current betting state
+
+        Args:
+            betting (BettingStateMachine): the table's betting state, with this
+                player as the seat to act
+
+        Returns:
+            (action, amount) pair, see game_utils.betting
+        """
+
+        if self.policy is None:
+            return CALL, 0
+
+        return self.policy(self, betting)
 
     def check(self):
         """"""
         pass
 
     def bet(self, amount):
-        """"""
+        """Puts chips into the pot
 
-        # If the amount of the given bet is more than the player's current chips, what do we do?
-        # In GUI-based poker applications, the GUI does not allow the player to select a bet size that is more
-        # then the amount of chips in their current stack.
-        # TODO: correct course
-        if amount > self.chips:
-            raise ValueError('Bet amount cannot be greater than current stack size.')
+        Args:
+            amount (int): the chips the player wants to put in
+
+        Returns:
+            the chips actually put in. A bet larger than the stack puts the
+            player all-in for whatever they have left
+        """
+
+        if amount < 0:
+            raise ValueError('Bet amount cannot be negative.')
+
+        if amount >= self.chips:
+            amount = self.chips
+            self.all_in = True
 
         self.chips -= amount
 
         return amount
 
-
     def fold(self):
         """"""
-        pass
+        self.folded = True
+
+    def new_hand(self):
+        """Clears the per-hand state before the cards are dealt"""
+
+        # A player with no chips left sits the hand out
+        self.current_hand = None
+        self.folded = self.chips == 0
+        self.all_in = False
@@ -0,0 +1,32 @@
+"""
+A few simple player policies, mostly as baselines for the simulator.
+
+A policy is called as policy(player, betting) with the table's
+BettingStateMachine, and returns an (action, amount) pair. Policies passed to
+the simulator have to be picklable, so they are plain module-level functions.
+"""
+
+from game_utils.betting import CALL, FOLD, FOLD_BIT, RAISE, RAISE_BIT
+
+
+def check_call(player, betting):
+    """Never folds and never raises"""
+    return CALL, 0
+
+
+def check_fold(player, betting):
+    """Checks when it can and folds to any bet"""
+
+    if betting.legal_actions() & FOLD_BIT:
+        return FOLD, 0
+
+    return CALL, 0
+
+
+def min_raise(player, betting):
+    """Makes the smallest legal raise whenever it can, and calls otherwise"""
+
+    if betting.legal_actions() & RAISE_BIT:
+        return RAISE, betting.min_raise_to()
+
+    return CALL, 0
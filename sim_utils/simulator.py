@@ -0,0 +1,141 @@
+"""
+Headless, high-volume hand simulator.
+
+Complete hands are played through Game on a pool of worker processes. Each
+worker plays a batch of hands and only sends back a small array of per-policy
+totals, never the hands themselves, so the results stream back cheaply as the
+batches finish.
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from board_utils.board import Board
+from card_utils.deck import Deck
+from game_utils.game import Game
+from interpreter.evaluator import HandEvaluator
+from player_utils.player import Player
+
+
+def simulate(policies, n_hands, starting_stack=100, small_blind=1, workers=1, batch_size=10000,
+             randomize_seats=True, seed=None, progress=None):
+    """Plays n_hands complete hands between the given policies
+
+    Every hand starts from the same stacks (a cash game with automatic top-ups),
+    so each hand's result is directly the chips won or lost. The button moves
+    after every hand, and the seating is shuffled before every hand when
+    randomize_seats is set.
+
+    Args:
+        policies (list): one picklable policy per seat, see sim_utils.policies
+        n_hands (int): number of hands to play
+        starting_stack (int): every player's stack at the start of each hand
+        small_blind (int): size of the small blind
+        workers (int): number of worker processes
+        batch_size (int): hands per batch sent to a worker
+        randomize_seats (bool): shuffle the seating before every hand
+        seed: seed for the random streams
+        progress (callable): optional, called with the running summary every
+            time a batch finishes
+
+    Returns:
+        summary dictionary, see _summarize
+    """
+
+    n_batches = -(-n_hands // batch_size)
+    streams = np.random.SeedSequence(seed).spawn(n_batches)
+    jobs = [
+        (policies, min(batch_size, n_hands - i * batch_size), starting_stack, small_blind,
+         randomize_seats, streams[i])
+        for i in range(n_batches)
+    ]
+
+    totals = np.zeros((3, len(policies)))
+    start = time.time()
+
+    if workers == 1:
+        for job in jobs:
+            totals += _simulate_worker(job)
+            if progress is not None:
+                progress(_summarize(totals=totals, seconds=time.time() - start, small_blind=small_blind))
+    else:
+        # Forked workers inherit the evaluator tables built here in the parent
+        HandEvaluator()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_simulate_worker, job) for job in jobs]
+            for future in as_completed(futures):
+                totals += future.result()
+                if progress is not None:
+                    progress(_summarize(totals=totals, seconds=time.time() - start, small_blind=small_blind))
+
+    return _summarize(totals=totals, seconds=time.time() - start, small_blind=small_blind)
+
+
+def _simulate_worker(job):
+    """Plays one batch of hands
+
+    Args:
+        job (tuple): policies, number of hands, starting stack, small blind,
+            whether to randomize seats and the SeedSequence of the batch
+
+    Returns:
+        (3, n_policies) array with the summed results, summed squared results
+        and number of hands played by each policy
+    """
+
+    policies, n_hands, starting_stack, small_blind, randomize_seats, stream = job
+
+    rng = np.random.default_rng(stream)
+    players = [Player(chips=starting_stack) for _ in policies]
+    game = Game(deck=Deck(seed=rng), board=Board(), small_blind=small_blind)
+    game.add_players(players)
+
+    totals = np.zeros((3, len(policies)))
+    seating = np.arange(len(policies))
+
+    for _ in range(n_hands):
+        if randomize_seats:
+            rng.shuffle(seating)
+
+        for seat, p in enumerate(players):
+            p.chips = starting_stack
+            p.policy = policies[seating[seat]]
+
+        game.play_hand()
+
+        for seat, p in enumerate(players):
+            result = p.chips - starting_stack
+            totals[0, seating[seat]] += result
+            totals[1, seating[seat]] += result * result
+            totals[2, seating[seat]] += 1
+
+    return totals
+
+
+def _summarize(totals, seconds, small_blind):
+    """Turns the summed results into per-policy statistics
+
+    Returns:
+        dictionary with the number of 'hands', the 'seconds' taken, 'hands_per_second',
+        and per policy the 'net' chips won, the mean chips won 'per_hand', its
+        'std_error' and the win rate in big blinds per 100 hands ('bb_per_100')
+    """
+
+    n = totals[2]
+    hands = int(n.max()) if len(n) else 0
+    safe_n = np.maximum(n, 1)
+
+    mean = totals[0] / safe_n
+    variance = np.maximum(totals[1] / safe_n - mean ** 2, 0)
+
+    return {
+        'hands': hands,
+        'seconds': seconds,
+        'hands_per_second': hands / seconds if seconds > 0 else 0.0,
+        'net': totals[0].copy(),
+        'per_hand': mean,
+        'std_error': np.sqrt(variance / safe_n),
+        'bb_per_100': 100 * mean / (2 * small_blind)
+    }
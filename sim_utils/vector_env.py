@@ -0,0 +1,385 @@
+"""
+Lock-step vectorized multi-table environment.
+
+N tables are held in stacked (N, P) arrays and advanced together: every call to
+step() takes one action for the seat to act at each table. The betting rules
+are the same as game_utils.betting.BettingStateMachine, written as array
+operations over the tables instead of one Python object per table. New hands
+are dealt for all of the finished tables with one Deck.deal_many call and their
+showdowns are settled with one batched evaluation.
+"""
+
+import numpy as np
+
+from card_utils.cards import VISIBLE_BOARD
+from card_utils.deck import Deck
+from game_utils.betting import ACTIVE, ALL_IN, CALL, CALL_BIT, FOLD, FOLD_BIT, FOLDED, RAISE, RAISE_BIT
+from interpreter.engine import InterpreterEngine
+
+
+class VectorEnv:
+
+    def __init__(self, n_tables, n_players=2, starting_stack=100, small_blind=1, seed=None, engine=None):
+        """
+
+        Every hand starts from the same stacks (a cash game with automatic
+        top-ups), so a hand's reward is directly the chips won or lost.
+
+        Args:
+            n_tables (int): number of tables N
+            n_players (int): seats per table P
+            starting_stack (int): every seat's stack at the start of each hand
+            small_blind (int): size of the small blind
+            seed: seed for the deals and the initial buttons
+            engine (InterpreterEngine): optional engine used for the showdowns
+        """
+
+        if n_players < 2:
+            raise ValueError('A table needs at least 2 players.')
+        if starting_stack <= 2 * small_blind:
+            raise ValueError('The starting stack has to cover more than the big blind.')
+
+        self.n_tables = n_tables
+        self.n_players = n_players
+        self.starting_stack = starting_stack
+        self.small_blind = small_blind
+        self.big_blind = 2 * small_blind
+
+        self.deck = Deck(seed=seed)
+        self.engine = engine if engine is not None else InterpreterEngine()
+
+        n, p = n_tables, n_players
+
+        # Player i holds columns 2i and 2i + 1, the board is the last 5 columns.
+        # The whole board is dealt up front and revealed street by street
+        self.cards = np.zeros((n, 2 * p + 5), dtype=np.int8)
+
+        self.stacks = np.zeros((n, p), dtype=np.int64)
+        self.street_bets = np.zeros((n, p), dtype=np.int64)
+        self.total_bets = np.zeros((n, p), dtype=np.int64)
+        self.status = np.zeros((n, p), dtype=np.int64)
+        self.acted_at = np.zeros((n, p), dtype=np.int64)
+
+        self.button = np.zeros(n, dtype=np.int64)
+        self.street = np.zeros(n, dtype=np.int64)
+        self.to_act = np.zeros(n, dtype=np.int64)
+        self.current_bet = np.zeros(n, dtype=np.int64)
+        self.min_raise = np.zeros(n, dtype=np.int64)
+        self.raise_count = np.zeros(n, dtype=np.int64)
+        self.pending = np.zeros(n, dtype=np.int64)
+        self.n_active = np.zeros(n, dtype=np.int64)
+        self.n_live = np.zeros(n, dtype=np.int64)
+
+        self._rows = np.arange(n)
+        self._offsets = np.arange(1, p + 1)
+
+        # Same layout as BettingStateMachine.state_vector, followed by the hole
+        # cards of the seat to act and the board, with -1 for unseen board cards
+        self.obs_size = 6 + 4 * p + 7
+        self._obs = np.zeros((n, self.obs_size), dtype=np.int64)
+
+    def reset(self):
+        """Deals a new hand at every table, with a random button
+
+        Returns:
+            (N, obs_size) observations, see observations()
+        """
+
+        self.button[:] = self.deck.rng.integers(self.n_players, size=self.n_tables)
+        self._start_hands(rows=self._rows)
+
+        return self.observations()
+
+    def step(self, actions, amounts=None):
+        """Applies one action at every table and moves the turns on
+
+        Illegal actions are mapped onto the closest legal one instead of raising,
+        so a batch never fails on one table: a FOLD with nothing to call checks,
+        and a RAISE that is not allowed calls. Raise amounts are clipped into the
+        legal range.
+
+        Tables whose hand ends are settled and immediately dealt a new hand, with
+        the button moved on, so the returned observations are always ones that
+        need an action.
+
+        Args:
+            actions (np.ndarray): (N,) FOLD, CALL or RAISE for the seat to act at each table
+            amounts (np.ndarray): optional (N,) raise-to amounts, i.e. total street
+                bets. Without them every RAISE is a minimum raise
+
+        Returns:
+            (N, obs_size) observations, (N, P) int64 rewards in chips, which are
+            only non-zero for the hands that ended, and the (N,) bool done flags
+        """
+
+        rows = self._rows
+        seat = self.to_act.copy()
+        actions = np.asarray(actions, dtype=np.int64)
+
+        seat_bet = self.street_bets[rows, seat]
+        seat_stack = self.stacks[rows, seat]
+        to_call = self.current_bet - seat_bet
+
+        # (0) Mapping illegal actions onto legal ones
+        can_fold = to_call > 0
+        can_raise = (seat_stack > to_call) & (self.acted_at[rows, seat] != self.raise_count)
+        actions = np.where((actions == FOLD) & ~can_fold, CALL, actions)
+        actions = np.where((actions == RAISE) & ~can_raise, CALL, actions)
+
+        fold = actions == FOLD
+        call = actions == CALL
+        raise_ = actions == RAISE
+
+        # (1) Folds leave the hand and the list of seats that can act
+        self.status[rows[fold], seat[fold]] = FOLDED
+        self.n_live -= fold
+        self.n_active -= fold
+
+        # (2) Calls and raises. Only a full raise reopens the betting
+        max_to = seat_bet + seat_stack
+        min_to = np.minimum(self.current_bet + self.min_raise, max_to)
+        target = min_to if amounts is None else np.clip(np.asarray(amounts, dtype=np.int64), min_to, max_to)
+
+        increment = target - self.current_bet
+        full = raise_ & (increment >= self.min_raise)
+        self.min_raise = np.where(full, increment, self.min_raise)
+        self.raise_count += full
+
+        put_in = np.where(call, np.minimum(to_call, seat_stack), 0)
+        put_in = np.where(raise_, target - seat_bet, put_in)
+        self.current_bet = np.where(raise_, target, self.current_bet)
+        self._commit(rows=rows, seats=seat, amounts=put_in)
+
+        # Everybody else who can still act has to respond to a raise
+        self.pending -= fold | call
+        still_active = self.status[rows, seat] == ACTIVE
+        self.pending = np.where(raise_, self.n_active - still_active, self.pending)
+        self.acted_at[rows, seat] = self.raise_count
+
+        # (3) Closing streets and moving the turn on
+        done = self.n_live == 1
+        closed = done | (self.pending <= 0)
+        done |= closed & (self.street == 3)
+
+        moving = ~closed
+        self.to_act[moving] = self._first_active_after(rows=rows[moving], seats=seat[moving])
+
+        advance = np.flatnonzero(closed & ~done)
+        while len(advance):
+            advance = self._next_street(rows=advance, done=done)
+
+        # (4) Settling the finished hands and dealing new ones
+        rewards = np.zeros((self.n_tables, self.n_players), dtype=np.int64)
+        finished = np.flatnonzero(done)
+        if len(finished):
+            rewards[finished] = self._showdown(rows=finished) - self.total_bets[finished]
+            self.button[finished] = (self.button[finished] + 1) % self.n_players
+            self._start_hands(rows=finished)
+
+        return self.observations(), rewards, done
+
+    def legal_actions(self):
+        """(N,) bitmasks of the legal actions at every table (FOLD_BIT, CALL_BIT, RAISE_BIT)"""
+
+        rows = self._rows
+        seat = self.to_act
+        to_call = self.current_bet - self.street_bets[rows, seat]
+
+        legal = np.full(self.n_tables, CALL_BIT, dtype=np.int64)
+        legal |= np.where(to_call > 0, FOLD_BIT, 0)
+        legal |= np.where((self.stacks[rows, seat] > to_call) & (self.acted_at[rows, seat] != self.raise_count),
+                          RAISE_BIT, 0)
+
+        return legal
+
+    def raise_bounds(self):
+        """(N,) smallest and (N,) largest legal raise-to amounts at every table"""
+
+        rows = self._rows
+        max_to = self.street_bets[rows, self.to_act] + self.stacks[rows, self.to_act]
+
+        return np.minimum(self.current_bet + self.min_raise, max_to), max_to
+
+    def observations(self):
+        """Integer observations of every table, from the point of view of the seat to act
+
+        The same preallocated array is filled in and returned on every call, so
+        copy it if it needs to outlive the next step.
+
+        Returns:
+            (N, obs_size) array of [street, to_act, current_bet, min_raise, pot, pending],
+            the stacks, street bets, total bets and status of every seat, the two
+            hole cards of the seat to act and the 5 board cards, -1 when unseen
+        """
+
+        p = self.n_players
+        obs = self._obs
+
+        obs[:, 0] = self.street
+        obs[:, 1] = self.to_act
+        obs[:, 2] = self.current_bet
+        obs[:, 3] = self.min_raise
+        obs[:, 4] = self.total_bets.sum(axis=1)
+        obs[:, 5] = self.pending
+        obs[:, 6:6 + p] = self.stacks
+        obs[:, 6 + p:6 + 2 * p] = self.street_bets
+        obs[:, 6 + 2 * p:6 + 3 * p] = self.total_bets
+        obs[:, 6 + 3 * p:6 + 4 * p] = self.status
+
+        hole = 6 + 4 * p
+        obs[:, hole] = self.cards[self._rows, 2 * self.to_act]
+        obs[:, hole + 1] = self.cards[self._rows, 2 * self.to_act + 1]
+
+        board = self.cards[:, 2 * p:]
+        visible = np.arange(5) < VISIBLE_BOARD[self.street][:, None]
+        obs[:, hole + 2:] = np.where(visible, board, -1)
+
+        return obs
+
+    def _start_hands(self, rows):
+        """Deals, resets the stacks and posts the blinds at the given tables"""
+
+        p = self.n_players
+
+        self.cards[rows] = self.deck.deal_many(n_deals=len(rows), n_players=p)
+
+        self.stacks[rows] = self.starting_stack
+        self.street_bets[rows] = 0
+        self.total_bets[rows] = 0
+        self.status[rows] = ACTIVE
+        self.acted_at[rows] = -1
+        self.street[rows] = 0
+        self.raise_count[rows] = 0
+        self.n_active[rows] = p
+        self.n_live[rows] = p
+
+        # Heads-up, the button posts the small blind
+        small_blind_position = self.button[rows] if p == 2 else (self.button[rows] + 1) % p
+        big_blind_position = (small_blind_position + 1) % p
+
+        self._commit(rows=rows, seats=small_blind_position, amounts=self.small_blind)
+        self._commit(rows=rows, seats=big_blind_position, amounts=self.big_blind)
+
+        self.current_bet[rows] = self.big_blind
+        self.min_raise[rows] = self.big_blind
+
+        # The starting stacks cover the big blind, so every seat can still act
+        self.pending[rows] = p
+        self.to_act[rows] = self._first_active_after(rows=rows, seats=big_blind_position)
+
+    def _next_street(self, rows, done):
+        """Opens the next street at the given tables
+
+        Returns:
+            the tables whose new street closed straight away, because at most one
+            seat can still act, and that have to move on again
+        """
+
+        self.street[rows] += 1
+        self.raise_count[rows] = 0
+        self.current_bet[rows] = 0
+        self.min_raise[rows] = self.big_blind
+        self.street_bets[rows] = 0
+        self.acted_at[rows] = -1
+
+        # A lone seat that can still act has nothing to respond to on a new street
+        lone = self.n_active[rows] <= 1
+        self.pending[rows] = np.where(lone, 0, self.n_active[rows])
+
+        acting = rows[~lone]
+        self.to_act[acting] = self._first_active_after(rows=acting, seats=self.button[acting])
+
+        closed = rows[lone]
+        last = self.street[closed] == 3
+        done[closed[last]] = True
+
+        return closed[~last]
+
+    def _first_active_after(self, rows, seats):
+        """First seat after each of `seats`, going clockwise, that can still act"""
+
+        candidates = (seats[:, None] + self._offsets) % self.n_players
+        active = self.status[rows[:, None], candidates] == ACTIVE
+        first = active.argmax(axis=1)
+
+        return np.where(active.any(axis=1), candidates[np.arange(len(rows)), first], seats)
+
+    def _commit(self, rows, seats, amounts):
+        """Moves chips from the seats' stacks into their bets"""
+
+        self.stacks[rows, seats] -= amounts
+        self.street_bets[rows, seats] += amounts
+        self.total_bets[rows, seats] += amounts
+
+        all_in = (self.stacks[rows, seats] == 0) & (self.status[rows, seats] == ACTIVE)
+        self.status[rows[all_in], seats[all_in]] = ALL_IN
+        self.n_active[rows] -= all_in
+
+    def _showdown(self, rows):
+        """Awards the main pot and every side pot at the given tables
+
+        Follows PotLedger.build_pots and PotLedger.award, one sorted position at
+        a time across all of the tables.
+
+        Returns:
+            (len(rows), P) chips won by each seat
+        """
+
+        p = self.n_players
+        n = len(rows)
+
+        contributions = self.total_bets[rows]
+        live = self.status[rows] != FOLDED
+
+        hole_cards = self.cards[rows, :2 * p].reshape(n, p, 2)
+        _, strength = self.engine.compare_hands_batch(hole_cards=hole_cards, boards=self.cards[rows, 2 * p:],
+                                                      active=live)
+
+        # (0) Each contribution level of a live seat caps one pot
+        order = np.argsort(contributions, axis=1, kind='stable')
+        levels = np.take_along_axis(contributions, order, axis=1)
+        live_sorted = np.take_along_axis(live, order, axis=1)
+
+        pots = np.zeros((n, p), dtype=np.int64)
+        previous = np.zeros(n, dtype=np.int64)
+        previous_capped = np.zeros(n, dtype=np.int64)
+        prefix = np.zeros(n, dtype=np.int64)
+        last = np.full(n, -1)
+        for position in range(p):
+            level = levels[:, position]
+            new = live_sorted[:, position] & (level > previous)
+            capped = prefix + level * (p - position)
+
+            pots[:, position] = np.where(new, capped - previous_capped, 0)
+            previous = np.where(new, level, previous)
+            previous_capped = np.where(new, capped, previous_capped)
+            last = np.where(new, position, last)
+            prefix += level
+
+        # Chips from folded seats above the last live level go to the last pot
+        has_pot = last >= 0
+        pots[has_pot, last[has_pot]] += contributions.sum(axis=1)[has_pot] - previous_capped[has_pot]
+
+        # (1) Awarding every pot, with the odd chips going to the first tied seats
+        # to the left of the button
+        from_button = (self.button[rows][:, None] + self._offsets) % p
+        payouts = np.zeros((n, p), dtype=np.int64)
+        for position in range(p):
+            amount = pots[:, position]
+            if not amount.any():
+                continue
+
+            eligible = live & (contributions >= levels[:, position][:, None])
+            scores = np.where(eligible, strength, -1)
+            winners = eligible & (scores == scores.max(axis=1)[:, None])
+
+            share, odd_chips = np.divmod(amount, np.maximum(winners.sum(axis=1), 1))
+
+            ordered = np.take_along_axis(winners, from_button, axis=1)
+            odd = ordered & (np.cumsum(ordered, axis=1) <= odd_chips[:, None])
+            bonus = np.zeros((n, p), dtype=np.int64)
+            np.put_along_axis(bonus, from_button, odd, axis=1)
+
+            payouts += winners * share[:, None] + bonus
+
+        return payouts
@@ -0,0 +1,361 @@
+"""
+Equity-histogram card abstraction.
+
+A hand's strength on the flop or the turn is not one number but a distribution:
+the same 60% equity can come from a made hand that rarely improves or from a
+draw that either gets there or misses. Each canonical (hole cards, board) deal
+(see card_utils.isomorphism.street_indexer) gets a histogram of its river equity
+against a random hand over every runout, and the histograms are clustered with
+k-means into a fixed number of buckets per street. On the river the histogram
+collapses onto the equity itself, which is stored as a single column.
+
+Building is split into steps that each leave their output on disk:
+    (1) build_histograms walks the canonical boards in chunks. Every chunk ranks
+        all 1326 holdings on all runouts with one engine call per block of
+        runouts, and writes its rows into a memory-mapped .npy file. A flag per
+        chunk records what is done, so an interrupted build picks up where it
+        stopped
+    (2) build_buckets fits k-means on a sample of the histograms, with either
+        the L2 or the earth mover's distance, and assigns every row to its
+        nearest center into a memory-mapped bucket map
+    (3) EquityBuckets opens the bucket maps and can be passed to LimitCFR as
+        its bucketer
+"""
+
+import os
+from itertools import combinations
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from card_utils.cards import COMBOS, RUNOUT_BLOCK, VISIBLE_BOARD
+from card_utils.isomorphism import board_indexer, street_indexer
+from equity_utils.preflop import preflop_class
+from equity_utils.ranges import ShowdownSweep
+from interpreter.engine import InterpreterEngine
+
+
+def build_histograms(directory, street, n_bins=50, chunk_size=64, engine=None):
+    """Computes the equity histogram of every canonical deal on a street
+
+    The output is street<k>_histograms.npy, with one row per index of
+    street_indexer, plus street<k>_done.npy with a flag per chunk of canonical
+    boards. Calling it again with the same arguments resumes an unfinished build.
+
+    Args:
+        directory (str): where to write the files
+        street (int): 1 (flop), 2 (turn) or 3 (river)
+        n_bins (int): histogram bins over [0, 1]. Ignored on the river
+        chunk_size (int): canonical boards per chunk
+        engine (InterpreterEngine): optional engine to rank the holdings
+
+    Returns:
+        the memory-mapped (n_deals, n_bins) histograms
+    """
+
+    if street not in (1, 2, 3):
+        raise ValueError('Histograms are built for streets 1 to 3, not {}.'.format(street))
+
+    engine = engine if engine is not None else InterpreterEngine()
+    board_len = int(VISIBLE_BOARD[street])
+    boards = board_indexer(board_len=board_len)
+    deals = street_indexer(board_len=board_len)
+    width = 1 if street == 3 else n_bins
+    n_chunks = -(-boards.size // chunk_size)
+
+    os.makedirs(directory, exist_ok=True)
+    histograms = _open_array(path=os.path.join(directory, 'street{}_histograms.npy'.format(street)),
+                             dtype=np.float16, shape=(deals.size, width))
+    done = _open_array(path=os.path.join(directory, 'street{}_done.npy'.format(street)),
+                       dtype=np.bool_, shape=(n_chunks,))
+
+    for chunk in np.flatnonzero(~done):
+        for idx in range(chunk * chunk_size, min((chunk + 1) * chunk_size, boards.size)):
+            board = boards.unindex(idx)
+            live = [i for i, (a, b) in enumerate(COMBOS.tolist()) if a not in board and b not in board]
+            rows = [deals.index(COMBOS[i].tolist() + board) for i in live]
+            histograms[rows] = _board_histograms(board=board, n_bins=width, engine=engine)[live]
+
+        # The rows have to reach the disk before the chunk is marked as done
+        histograms.flush()
+        done[chunk] = True
+        done.flush()
+
+    return histograms
+
+
+def kmeans(points, k, metric='emd', iterations=30, sample_size=200000, seed=None, chunk_size=8192):
+    """Fits k-means centers to a set of histograms
+
+    The earth mover's distance between two histograms over the same ordered bins
+    is the L1 distance between their cumulative sums, so with metric='emd' the
+    points are clustered as CDFs. Centers are the means of their members in both
+    cases.
+
+    Args:
+        points (np.ndarray): (N, n_bins) histograms, e.g. from build_histograms
+        k (int): number of clusters
+        metric (str): 'emd' or 'l2'
+        iterations (int): Lloyd iterations
+        sample_size (int): the fit runs on a random sample of this many points
+        seed: seed for the sample and the k-means++ initialization
+        chunk_size (int): points per block when computing distances
+
+    Returns:
+        (k, n_bins) centers as histograms, ordered by increasing mean equity
+    """
+
+    if metric not in ('emd', 'l2'):
+        raise ValueError('Unknown metric {}, expected "emd" or "l2".'.format(metric))
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(points), size=min(sample_size, len(points)), replace=False)
+    data = _features(points=np.asarray(points[np.sort(sample)], dtype=np.float32), metric=metric)
+
+    if len(data) < k:
+        raise ValueError('Cannot fit {} clusters to {} points.'.format(k, len(data)))
+
+    # k-means++ seeding
+    centers = np.empty((k, data.shape[1]), dtype=np.float32)
+    centers[0] = data[rng.integers(len(data))]
+    nearest = _distances(data=data, centers=centers[:1], metric=metric, chunk_size=chunk_size)[:, 0]
+    for j in range(1, k):
+        total = nearest.sum()
+        pick = rng.choice(len(data), p=nearest / total) if total > 0 else rng.integers(len(data))
+        centers[j] = data[pick]
+        np.minimum(nearest, _distances(data=data, centers=centers[j:j + 1], metric=metric,
+                                       chunk_size=chunk_size)[:, 0], out=nearest)
+
+    for _ in range(iterations):
+        distances = _distances(data=data, centers=centers, metric=metric, chunk_size=chunk_size)
+        labels = distances.argmin(axis=1)
+
+        sizes = np.bincount(labels, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=column, minlength=k) for column in data.T], axis=1)
+        moved = sums[sizes > 0] / sizes[sizes > 0, None]
+
+        # Empty clusters restart at the points farthest from their centers
+        empty = np.flatnonzero(sizes == 0)
+        if len(empty):
+            farthest = np.argsort(distances[np.arange(len(data)), labels])[::-1][:len(empty)]
+            centers[empty] = data[farthest]
+
+        if np.allclose(centers[sizes > 0], moved, atol=1e-6) and not len(empty):
+            break
+        centers[sizes > 0] = moved
+
+    if metric == 'emd':
+        centers = np.diff(centers, axis=1, prepend=0)
+
+    return centers[np.argsort(_mean_equity(centers))]
+
+
+def assign(points, centers, metric='emd', chunk_size=8192, out=None):
+    """Nearest center of every histogram
+
+    Args:
+        points (np.ndarray): (N, n_bins) histograms
+        centers (np.ndarray): (k, n_bins) histograms, e.g. from kmeans
+        metric (str): 'emd' or 'l2'
+        chunk_size (int): points per block
+        out (np.ndarray): optional (N,) array to write the buckets into
+
+    Returns:
+        (N,) bucket of every point
+    """
+
+    if out is None:
+        out = np.empty(len(points), dtype=np.uint16)
+
+    centers = _features(points=np.asarray(centers, dtype=np.float32), metric=metric)
+    for start in range(0, len(points), chunk_size):
+        data = _features(points=np.asarray(points[start:start + chunk_size], dtype=np.float32), metric=metric)
+        out[start:start + len(data)] = _distances(data=data, centers=centers, metric=metric,
+                                                  chunk_size=chunk_size).argmin(axis=1)
+
+    return out
+
+
+def build_buckets(directory, street, n_buckets, metric='emd', iterations=30, sample_size=200000, seed=None):
+    """Clusters the histograms of a street and writes its bucket map
+
+    Reads street<k>_histograms.npy and writes street<k>_centers.npy and the
+    memory-mapped street<k>_buckets.npy. Centers that are already on disk are
+    reused, so only the assignment is redone after an interruption.
+
+    Args:
+        directory (str): the directory used by build_histograms
+        street (int): 1 to 3
+        n_buckets (int): number of buckets
+        metric (str): 'emd' or 'l2'. The river's single equity column is
+            clustered with 'l2', which is the same as 'emd' in one dimension
+        iterations (int): Lloyd iterations
+        sample_size (int): histograms sampled for the fit
+        seed: seed of the fit
+
+    Returns:
+        the memory-mapped (n_deals,) bucket map
+    """
+
+    histograms = np.load(os.path.join(directory, 'street{}_histograms.npy'.format(street)), mmap_mode='r')
+    done = np.load(os.path.join(directory, 'street{}_done.npy'.format(street)), mmap_mode='r')
+    if not done.all():
+        raise ValueError('The street {} histograms are not finished.'.format(street))
+
+    if histograms.shape[1] == 1:
+        metric = 'l2'
+
+    centers_path = os.path.join(directory, 'street{}_centers.npy'.format(street))
+    if os.path.exists(centers_path) and len(np.load(centers_path)) == n_buckets:
+        centers = np.load(centers_path)
+    else:
+        centers = kmeans(points=histograms, k=n_buckets, metric=metric, iterations=iterations,
+                         sample_size=sample_size, seed=seed)
+        np.save(centers_path, centers)
+
+    buckets = open_memmap(os.path.join(directory, 'street{}_buckets.npy'.format(street)), mode='w+',
+                          dtype=np.uint16, shape=(len(histograms),))
+    assign(points=histograms, centers=centers, metric=metric, out=buckets)
+    buckets.flush()
+
+    return buckets
+
+
+class EquityBuckets:
+
+    def __init__(self, directory):
+        """Card abstraction backed by the bucket maps of build_buckets
+
+        Preflop hands are bucketed losslessly into their 169 classes, as in
+        HandStrengthBuckets.
+
+        Args:
+            directory (str): the directory holding street<k>_buckets.npy for
+                streets 1 to 3
+        """
+
+        self.maps = {}
+        n_buckets = [169]
+        for street in (1, 2, 3):
+            self.maps[street] = np.load(os.path.join(directory, 'street{}_buckets.npy'.format(street)),
+                                        mmap_mode='r')
+            centers = np.load(os.path.join(directory, 'street{}_centers.npy'.format(street)))
+            n_buckets.append(len(centers))
+
+        self.n_buckets = tuple(n_buckets)
+
+    def bucket(self, hole_cards, board):
+        """Bucket of one deal
+
+        Args:
+            hole_cards: the two hole card codes
+            board: the 0 or 3 to 5 board card codes
+
+        Returns:
+            the bucket on the street of the board
+        """
+
+        if len(board) == 0:
+            return preflop_class(hole_cards)
+
+        street = VISIBLE_BOARD.tolist().index(len(board))
+        idx = street_indexer(board_len=len(board)).index([int(c) for c in hole_cards] + [int(c) for c in board])
+
+        return int(self.maps[street][idx])
+
+    def __call__(self, street, hole_cards, boards):
+        """Buckets of both players for a batch of deals
+
+        Args:
+            street (int): 0 to 3
+            hole_cards (np.ndarray): (B, 2, 2) card codes of the two players
+            boards (np.ndarray): (B, k) card codes of the board visible on the street
+
+        Returns:
+            (B, 2) array of buckets
+        """
+
+        hole_cards = np.asarray(hole_cards).tolist()
+        boards = np.asarray(boards).tolist() if street else [[]] * len(hole_cards)
+
+        return np.array([[self.bucket(hole_cards=hole, board=board) for hole in pair]
+                         for pair, board in zip(hole_cards, boards)], dtype=np.int64)
+
+
+def _board_histograms(board, n_bins, engine):
+    """Equity histograms of all 1326 holdings on one board
+
+    Returns:
+        (1326, n_bins) histograms, normalized over the runouts each holding can
+        see. On a complete board n_bins is 1 and the row is the equity itself
+    """
+
+    live = [c for c in range(52) if c not in board]
+    runouts = np.array(list(combinations(live, 5 - len(board))), dtype=np.int64)
+    full = np.hstack([np.tile(board, (len(runouts), 1)), runouts])
+
+    counts = np.zeros((len(COMBOS), n_bins))
+    for start in range(0, len(full), RUNOUT_BLOCK):
+        sweep = ShowdownSweep(ranks=engine.rank_holdings(board=full[start:start + RUNOUT_BLOCK]))
+        wins, ties, losses = sweep.counts(reach=np.ones(len(COMBOS)))
+        seen = wins + ties + losses
+        equity = (wins + 0.5 * ties) / np.maximum(seen, 1)
+
+        # A complete board has the one runout
+        if n_bins == 1:
+            return equity.T
+
+        bins = np.minimum((equity * n_bins).astype(np.int64), n_bins - 1)
+        combos = np.broadcast_to(np.arange(len(COMBOS)), bins.shape)
+        visible = seen > 0
+        counts += np.bincount(combos[visible] * n_bins + bins[visible],
+                              minlength=len(COMBOS) * n_bins).reshape(len(COMBOS), n_bins)
+
+    return counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+
+def _open_array(path, dtype, shape):
+    """Opens a memory-mapped .npy file for a resumable build, creating it if needed"""
+
+    if not os.path.exists(path):
+        return open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+
+    array = open_memmap(path, mode='r+')
+    if array.shape != shape or array.dtype != dtype:
+        raise ValueError('{} holds {} {}, not {} {}; remove it to rebuild.'.format(
+            path, array.shape, array.dtype, shape, np.dtype(dtype)))
+
+    return array
+
+
+def _features(points, metric):
+    """Points in the space where the metric is L1 ('emd') or L2 ('l2')"""
+
+    return np.cumsum(points, axis=1) if metric == 'emd' else points
+
+
+def _distances(data, centers, metric, chunk_size):
+    """(N, k) distances from points to centers, L1 for 'emd' and squared L2 for 'l2'"""
+
+    if metric == 'l2':
+        distances = (data * data).sum(axis=1)[:, None] - 2 * data @ centers.T + (centers * centers).sum(axis=1)
+        return np.maximum(distances, 0)
+
+    # Bound the (rows, k, n_bins) intermediate to about chunk_size * n_bins values
+    rows = max(1, chunk_size // len(centers))
+    distances = np.empty((len(data), len(centers)), dtype=np.float32)
+    for start in range(0, len(data), rows):
+        block = data[start:start + rows, None, :] - centers[None, :, :]
+        distances[start:start + rows] = np.abs(block).sum(axis=2)
+
+    return distances
+
+
+def _mean_equity(histograms):
+    """Mean equity of histograms over evenly spaced bins on [0, 1]"""
+
+    n_bins = histograms.shape[1]
+    if n_bins == 1:
+        return histograms[:, 0]
+
+    return histograms @ ((np.arange(n_bins) + 0.5) / n_bins)
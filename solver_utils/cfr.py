@@ -0,0 +1,398 @@
+"""
+Counterfactual regret minimization for heads-up limit hold'em subgames.
+
+The betting tree of a subgame is built once into flat arrays. An information
+set is a decision node together with the acting player's bucket on the current
+street (an imperfect-recall card abstraction), so every decision node owns a
+contiguous block of n_buckets rows in the preallocated regret and strategy
+arrays, and an infoset index is simply the node's base offset plus a bucket.
+
+Each iteration samples a whole batch of deals and walks the betting tree once,
+carrying one reach probability per deal. Regret and strategy updates for all
+of the deals that land in the same infoset are summed with np.bincount.
+
+Player 0 is the big blind, who acts first after the flop, and player 1 is the
+button, who acts first before it.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from card_utils.cards import COMBO_INDEX, COMBO_MASKS, VISIBLE_BOARD, cards_to_masks
+from card_utils.deck import Deck
+from equity_utils.ranges import ShowdownSweep
+from game_utils.betting import CALL, FOLD, RAISE
+from interpreter.engine import InterpreterEngine
+from interpreter.evaluator import HandEvaluator
+
+# Node kinds
+DECISION = 0
+FOLD_NODE = 1
+SHOWDOWN = 2
+
+
+class HandStrengthBuckets:
+
+    def __init__(self, n_buckets=(169, 50, 50, 50)):
+        """Card abstraction by hand strength
+
+        Preflop hands are bucketed losslessly into their 169 classes (see
+        equity_utils.preflop.preflop_class). After the flop, the bucket is the
+        hand strength, i.e. the fraction of the opponent holdings that the hand
+        currently beats (ties counting half), cut into n_buckets equal slices.
+
+        Args:
+            n_buckets (tuple): number of buckets on each street. The preflop
+                entry has to be 169
+        """
+
+        if n_buckets[0] != 169:
+            raise ValueError('Preflop hands are bucketed into their 169 classes.')
+
+        self.n_buckets = tuple(n_buckets)
+        self.engine = InterpreterEngine()
+
+    def __call__(self, street, hole_cards, boards):
+        """Buckets of both players for a batch of deals
+
+        Args:
+            street (int): 0 to 3
+            hole_cards (np.ndarray): (B, 2, 2) card codes of the two players
+            boards (np.ndarray): (B, k) card codes of the board visible on the street
+
+        Returns:
+            (B, 2) array of buckets
+        """
+
+        hole_cards = np.asarray(hole_cards, dtype=np.int64)
+
+        if street == 0:
+            ranks = hole_cards % 13
+            high = ranks.max(axis=2)
+            low = ranks.min(axis=2)
+            suited = hole_cards[:, :, 0] // 13 == hole_cards[:, :, 1] // 13
+            return np.where(suited, high * 13 + low, low * 13 + high)
+
+        # Batches often share boards (a subgame deals from one fixed board), so
+        # every distinct board is ranked and swept once
+        boards, board_of = np.unique(np.sort(np.asarray(boards), axis=1), axis=0, return_inverse=True)
+        wins, ties, losses = ShowdownSweep(ranks=self.engine.rank_holdings(board=boards)).counts(
+            reach=np.ones(len(COMBO_MASKS)))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            strength = (wins + 0.5 * ties) / (wins + ties + losses)
+
+        n = self.n_buckets[street]
+        combos = COMBO_INDEX[hole_cards[:, :, 0], hole_cards[:, :, 1]]
+        buckets = np.minimum((strength[board_of.reshape(-1, 1), combos] * n).astype(np.int64), n - 1)
+
+        return buckets
+
+
+class LimitCFR:
+
+    def __init__(self, start_street=0, board=None, pot=0, small_bet=2, big_bet=4, cap=4, bucketer=None,
+                 plus=True, seed=None):
+        """Builds the betting tree of a subgame and allocates its regret tables
+
+        Args:
+            start_street (int): street the subgame starts on, 0 being preflop
+            board (list): known board card codes. Missing board cards are sampled
+            pot (int): chips already in the pot at the root, put in equally by both
+                players. Preflop, the blinds are posted on top of it
+            small_bet (int): bet size preflop and on the flop, also the big blind
+            big_bet (int): bet size on the turn and the river
+            cap (int): maximum number of bets and raises per street. Preflop, the
+                big blind counts as the first bet
+            bucketer (callable): card abstraction, see HandStrengthBuckets. Called
+                as bucketer(street, hole_cards, boards) and must have n_buckets
+            plus (bool): use CFR+ (regrets floored at zero and linearly weighted
+                averaging) instead of vanilla CFR
+            seed: seed for the chance sampling
+        """
+
+        if not 0 <= start_street <= 3:
+            raise ValueError('The start street must be between 0 (preflop) and 3 (river).')
+        if cap < 1:
+            raise ValueError('The cap must allow at least one bet per street.')
+
+        self.start_street = start_street
+        self.board = [int(c) for c in board] if board is not None else []
+        if len(self.board) > 5 or len(set(self.board)) != len(self.board):
+            raise ValueError('The board must be at most 5 distinct cards.')
+
+        self.pot = pot
+        self.small_bet = small_bet
+        self.big_bet = big_bet
+        self.cap = cap
+        self.plus = plus
+
+        self.bucketer = bucketer if bucketer is not None else HandStrengthBuckets()
+        self.n_buckets = tuple(self.bucketer.n_buckets)
+        self.evaluator = HandEvaluator()
+        self.deck = Deck(seed=seed)
+
+        self._build_tree()
+
+        self.regrets = np.zeros((self.n_infosets, 3))
+        self.strategy_sum = np.zeros((self.n_infosets, 3))
+        self.iteration = 0
+
+    def run(self, iterations, batch_size=1000, checkpoint_path=None, checkpoint_every=None):
+        """Runs CFR iterations, each on a fresh batch of sampled deals
+
+        Args:
+            iterations (int): number of iterations to run
+            batch_size (int): deals sampled per iteration
+            checkpoint_path (str): optional file to checkpoint to, see save()
+            checkpoint_every (int): iterations between checkpoints. Without it, a
+                checkpoint is only written at the end
+        """
+
+        root = 0
+        for i in range(iterations):
+            buckets, outcome = self._sample(batch_size=batch_size)
+
+            self.iteration += 1
+            weight = self.iteration if self.plus else 1
+            ones = np.ones(batch_size)
+            self._traverse(node=root, reach0=ones, reach1=ones, buckets=buckets, outcome=outcome, weight=weight)
+
+            if checkpoint_path is not None and checkpoint_every and (i + 1) % checkpoint_every == 0:
+                self.save(checkpoint_path)
+
+        if checkpoint_path is not None:
+            self.save(checkpoint_path)
+
+    def average_strategy(self):
+        """Average strategy of every infoset, which converges to an equilibrium
+
+        Returns:
+            (n_infosets, 3) array of FOLD, CALL and RAISE probabilities. Infosets
+            that were never reached play their legal actions uniformly
+        """
+
+        legal = np.repeat(self.legal[self.infoset_node_list], self.infoset_sizes, axis=0)
+        totals = self.strategy_sum.sum(axis=1, keepdims=True)
+        uniform = legal / legal.sum(axis=1, keepdims=True)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(totals > 0, self.strategy_sum / totals, uniform)
+
+    def infoset(self, node, bucket):
+        """Infoset index of a decision node and the acting player's bucket"""
+
+        if self.kind[node] != DECISION:
+            raise ValueError('Node {} is not a decision node.'.format(node))
+
+        return self.base[node] + bucket
+
+    def save(self, path):
+        """Writes a checkpoint that load() can resume from
+
+        The file is written next to its destination and then moved into place,
+        so an interrupted save never leaves a broken checkpoint behind.
+
+        Args:
+            path (str): location of the checkpoint file
+        """
+
+        config = np.array([self.start_street, self.pot, self.small_bet, self.big_bet, self.cap, self.plus,
+                           self.iteration], dtype=np.int64)
+
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, config=config, board=np.array(self.board, dtype=np.int64),
+                     n_buckets=np.array(self.n_buckets, dtype=np.int64),
+                     rng_state=np.array(json.dumps(self.deck.rng.bit_generator.state)),
+                     regrets=self.regrets, strategy_sum=self.strategy_sum)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, bucketer=None):
+        """Resumes a solver from a checkpoint written by save()
+
+        Args:
+            path (str): location of the checkpoint file
+            bucketer (callable): the card abstraction the checkpoint was built
+                with, when it is not the default HandStrengthBuckets
+
+        Returns:
+            LimitCFR
+        """
+
+        with np.load(path) as data:
+            start_street, pot, small_bet, big_bet, cap, plus, iteration = data['config'].tolist()
+            n_buckets = tuple(data['n_buckets'].tolist())
+
+            if bucketer is None:
+                bucketer = HandStrengthBuckets(n_buckets=n_buckets)
+            if tuple(bucketer.n_buckets) != n_buckets:
+                raise ValueError('The checkpoint uses {} buckets, not {}.'.format(n_buckets, bucketer.n_buckets))
+
+            solver = cls(start_street=start_street, board=data['board'].tolist(), pot=pot, small_bet=small_bet,
+                         big_bet=big_bet, cap=cap, bucketer=bucketer, plus=bool(plus))
+
+            solver.regrets[:] = data['regrets']
+            solver.strategy_sum[:] = data['strategy_sum']
+            solver.iteration = iteration
+            solver.deck.rng.bit_generator.state = json.loads(str(data['rng_state']))
+
+        return solver
+
+    def _build_tree(self):
+        """Lays out the betting tree in flat arrays, depth first from the root
+
+        Sets kind, player, street, children (-1 for illegal actions), legal,
+        contributions, the fold value for player 0 at fold nodes, the infoset
+        base of each decision node and the action history of every node.
+        """
+
+        kinds, players, streets, children, contributions, histories = [], [], [], [], [], []
+
+        def add(kind, player, street, contribution, history):
+            kinds.append(kind)
+            players.append(player)
+            streets.append(street)
+            children.append([-1, -1, -1])
+            contributions.append(contribution)
+            histories.append(history)
+            return len(kinds) - 1
+
+        def bet_size(street):
+            return self.small_bet if street < 2 else self.big_bet
+
+        def close_street(street, contribution, history):
+            if street == 3:
+                return add(SHOWDOWN, -1, street, contribution, history)
+            return decision(street + 1, contribution, 0, 0, False, history + '/')
+
+        def decision(street, contribution, player, bets, other_acted, history):
+            node = add(DECISION, player, street, contribution, history)
+            to_call = contribution[1 - player] - contribution[player]
+
+            if to_call > 0:
+                folded = list(contribution)
+                children[node][FOLD] = add(FOLD_NODE, player, street, folded, history + 'f')
+
+            called = list(contribution)
+            called[player] += to_call
+            if other_acted:
+                children[node][CALL] = close_street(street, called, history + 'c')
+            else:
+                children[node][CALL] = decision(street, called, 1 - player, bets, True, history + 'c')
+
+            if bets < self.cap:
+                raised = list(contribution)
+                raised[player] += to_call + bet_size(street)
+                children[node][RAISE] = decision(street, raised, 1 - player, bets + 1, True, history + 'r')
+
+            return node
+
+        half = self.pot // 2
+        if self.start_street == 0:
+            decision(0, [half + self.small_bet, half + self.small_bet // 2], 1, 1, False, '')
+        else:
+            decision(self.start_street, [half, half], 0, 0, False, '')
+
+        self.kind = np.array(kinds, dtype=np.int8)
+        self.player = np.array(players, dtype=np.int8)
+        self.street = np.array(streets, dtype=np.int8)
+        self.children = np.array(children, dtype=np.int64)
+        self.legal = self.children >= 0
+        self.contributions = np.array(contributions, dtype=np.int64)
+        self.histories = histories
+
+        # The folding player loses what they put in, the other player wins it
+        self.fold_value = np.where(self.player == 0, -self.contributions[:, 0], self.contributions[:, 1])
+
+        decisions = self.kind == DECISION
+        self.infoset_node_list = np.flatnonzero(decisions)
+        self.infoset_sizes = np.array([self.n_buckets[s] for s in self.street[decisions]], dtype=np.int64)
+
+        self.base = np.full(len(kinds), -1, dtype=np.int64)
+        self.base[decisions] = np.cumsum(self.infoset_sizes) - self.infoset_sizes
+        self.n_infosets = int(self.infoset_sizes.sum())
+
+    def _sample(self, batch_size):
+        """Samples a batch of deals consistent with the known board
+
+        Returns:
+            (B, 4, 2) buckets of both players on every street, unused before the
+            start street, and the (B,) showdown outcome for player 0 (1, 0 or -1)
+        """
+
+        known = self.board
+        deals = self.deck.deal_many(n_deals=batch_size, n_players=2, board_len=5 - len(known),
+                                    dead_cards=known if known else None)
+
+        hole_cards = deals[:, :4].reshape(batch_size, 2, 2)
+        boards = np.empty((batch_size, 5), dtype=np.int64)
+        boards[:, :len(known)] = known
+        boards[:, len(known):] = deals[:, 4:]
+
+        buckets = np.zeros((batch_size, 4, 2), dtype=np.int64)
+        for street in range(self.start_street, 4):
+            buckets[:, street] = self.bucketer(street, hole_cards, boards[:, :VISIBLE_BOARD[street]])
+
+        ranks = self.evaluator.evaluate_masks(cards_to_masks(hole_cards) | cards_to_masks(boards)[:, None])
+
+        return buckets, np.sign(ranks[:, 0] - ranks[:, 1])
+
+    def _traverse(self, node, reach0, reach1, buckets, outcome, weight):
+        """Walks the subtree below a node for a whole batch of deals
+
+        Regrets and strategy sums are updated on the way back up.
+
+        Returns:
+            (B,) values of the node for player 0, in chips
+        """
+
+        kind = self.kind[node]
+        if kind == FOLD_NODE:
+            return self.fold_value[node]
+        if kind == SHOWDOWN:
+            return outcome * self.contributions[node, 0]
+
+        player = self.player[node]
+        street = self.street[node]
+        base = self.base[node]
+        n = self.n_buckets[street]
+        local = buckets[:, street, player]
+
+        actions = np.flatnonzero(self.legal[node])
+        positive = np.maximum(self.regrets[base + local][:, actions], 0)
+        totals = positive.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            strategy = np.where(totals > 0, positive / totals, 1 / len(actions))
+
+        values = np.empty(strategy.shape)
+        for j, a in enumerate(actions):
+            if player == 0:
+                values[:, j] = self._traverse(self.children[node, a], reach0 * strategy[:, j], reach1,
+                                              buckets, outcome, weight)
+            else:
+                values[:, j] = self._traverse(self.children[node, a], reach0, reach1 * strategy[:, j],
+                                              buckets, outcome, weight)
+
+        node_value = (strategy * values).sum(axis=1)
+
+        # Regrets are weighted by the opponent's reach and the strategy sum by the
+        # player's own reach
+        if player == 0:
+            own, counterfactual = reach0, reach1
+        else:
+            own, counterfactual = reach1, -reach0
+
+        regret = (values - node_value[:, None]) * counterfactual[:, None]
+        block = slice(base, base + n)
+        for j, a in enumerate(actions):
+            self.regrets[block, a] += np.bincount(local, weights=regret[:, j], minlength=n)
+            self.strategy_sum[block, a] += np.bincount(local, weights=weight * own * strategy[:, j], minlength=n)
+
+        if self.plus:
+            np.maximum(self.regrets[block], 0, out=self.regrets[block])
+
+        return node_value
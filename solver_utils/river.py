@@ -0,0 +1,301 @@
+"""
+Range-vs-range no-limit river solver.
+
+Both players hold a full range, a weight for each of the 1326 holdings, and
+the solver runs CFR+ on whole range vectors at once: every node of the betting
+tree is visited once per iteration with a (1326,) reach vector per player.
+
+The expensive step of a range solver is the showdown, where every holding has
+to be compared with every opponent holding that does not share a card with it.
+Instead of a dense 1326x1326 payoff matrix, the holdings are sorted by strength
+once per board (see equity_utils.ranges.ShowdownSweep). A showdown is then a
+prefix sum over the opponent's reach in strength order, giving the weight each
+holding beats and loses to, corrected for card removal by subtracting the same
+prefix sums taken over the 51 holdings that contain each of its two cards.
+
+Player 0 is out of position and acts first.
+"""
+
+import numpy as np
+
+from card_utils.cards import COMBOS
+from equity_utils.ranges import ShowdownSweep, parse_range
+from interpreter.engine import InterpreterEngine
+
+# Node kinds
+DECISION = 0
+FOLD_NODE = 1
+SHOWDOWN = 2
+
+
+class RiverSolver:
+
+    def __init__(self, board, ranges, pot, stack, bet_sizes=(0.5, 1.0), raise_sizes=(1.0,), max_raises=2,
+                 all_in=True, engine=None):
+        """Builds the betting tree and the strength ordering of a river spot
+
+        Args:
+            board (list): the 5 board card codes
+            ranges: each player's range, as range text or as (1326,) weights in
+                the order of card_utils.cards.COMBOS (see equity_utils.ranges).
+                Holdings that use a board card are ignored
+            pot (int): chips in the pot at the start of the river, put in equally
+            stack (int): effective stack behind at the start of the river
+            bet_sizes (tuple): bet sizes as fractions of the pot
+            raise_sizes (tuple): raise sizes as fractions of the pot after calling
+            max_raises (int): most bets and raises allowed on the river
+            all_in (bool): whether going all-in is always one of the bet sizes
+            engine (InterpreterEngine): optional engine to rank the holdings
+        """
+
+        if len(board) != 5 or len(set(int(c) for c in board)) != 5:
+            raise ValueError('A river board must be 5 distinct cards.')
+
+        ranges = np.array([parse_range(r) if isinstance(r, str) else r for r in ranges], dtype=np.float64)
+        if ranges.shape != (2, len(COMBOS)):
+            raise ValueError('Ranges must have shape (2, {}).'.format(len(COMBOS)))
+
+        self.board = [int(c) for c in board]
+        self.pot = pot
+        self.stack = stack
+        self.bet_sizes = tuple(bet_sizes)
+        self.raise_sizes = tuple(raise_sizes)
+        self.max_raises = max_raises
+        self.all_in = all_in
+        self.engine = engine if engine is not None else InterpreterEngine()
+
+        ranks = self.engine.rank_holdings(board=self.board)
+        self.valid = ranks > 0
+        self.ranges = ranges * self.valid
+
+        self.sweep = ShowdownSweep(ranks=ranks)
+        self._build_tree()
+
+        n_decisions = len(self.decision_nodes)
+        width = self.children.shape[1]
+        self.regrets = np.zeros((n_decisions, len(COMBOS), width))
+        self.strategy_sum = np.zeros((n_decisions, len(COMBOS), width))
+        self.iteration = 0
+
+    def solve(self, iterations=200):
+        """Runs CFR+ iterations, with alternating updates and linear averaging
+
+        Args:
+            iterations (int): number of iterations to run
+
+        Returns:
+            the exploitability of the average strategy, see exploitability()
+        """
+
+        for _ in range(iterations):
+            self.iteration += 1
+            for player in (0, 1):
+                self._cfr(node=0, traverser=player, reach_own=self.ranges[player],
+                          reach_other=self.ranges[1 - player])
+
+        return self.exploitability()
+
+    def average_strategy(self, node):
+        """Average strategy of every holding at a decision node
+
+        Returns:
+            (1326, n_actions) probabilities of the node's actions, in the order of
+            actions[node]. Holdings that never reach the node play uniformly
+        """
+
+        d = self.decision_index[node]
+        k = len(self.actions[node])
+        totals = self.strategy_sum[d, :, :k].sum(axis=1, keepdims=True)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(totals > 0, self.strategy_sum[d, :, :k] / totals, 1 / k)
+
+    def exploitability(self):
+        """How much a best response gains against the average strategy
+
+        Returns:
+            the mean of what each player's best response wins against the other
+            player's average strategy, in chips per hand. It is zero at an equilibrium
+        """
+
+        norm = (self.ranges[0] * self._compatible_weight(reach=self.ranges[1])).sum()
+        if norm == 0:
+            return 0.0
+
+        total = 0.0
+        for player in (0, 1):
+            values = self._best_response(node=0, traverser=player, reach_other=self.ranges[1 - player])
+            total += (self.ranges[player] * values).sum() / norm
+
+        return total / 2
+
+    def showdown_values(self, reach):
+        """Net showdown result of every holding against an opponent range, per chip
+
+        Args:
+            reach (np.ndarray): (1326,) weights of the opponent's holdings
+
+        Returns:
+            (1326,) array with the opponent weight each holding beats minus the
+            weight it loses to, counting only holdings that share no card with it
+        """
+
+        wins, _, losses = self.sweep.counts(reach=reach)
+
+        return wins - losses
+
+    def _build_tree(self):
+        """Lays out the betting tree in flat arrays, depth first from the root
+
+        Sets kind, player (the acting or folding player), contributions, children
+        (padded with -1), the action labels and history of every node, and the
+        row of each decision node in the regret tables.
+        """
+
+        half = self.pot // 2
+        kinds, players, contributions, children, actions, histories = [], [], [], [], [], []
+
+        def add(kind, player, contribution, history):
+            kinds.append(kind)
+            players.append(player)
+            contributions.append(contribution)
+            children.append([])
+            actions.append([])
+            histories.append(history)
+            return len(kinds) - 1
+
+        def branch(node, label, child):
+            children[node].append(child)
+            actions[node].append(label)
+
+        def decision(contribution, player, raises, other_acted, history):
+            node = add(DECISION, player, contribution, history)
+            other = 1 - player
+            to_call = contribution[other] - contribution[player]
+            behind = self.stack - (contribution[player] - half)
+            other_behind = self.stack - (contribution[other] - half)
+
+            if to_call > 0:
+                branch(node, 'f', add(FOLD_NODE, player, list(contribution), history + 'f'))
+
+                called = list(contribution)
+                called[player] += min(to_call, behind)
+                branch(node, 'c', add(SHOWDOWN, -1, called, history + 'c'))
+            elif other_acted:
+                branch(node, 'x', add(SHOWDOWN, -1, list(contribution), history + 'x'))
+            else:
+                branch(node, 'x', decision(contribution, other, raises, True, history + 'x'))
+
+            if raises >= self.max_raises or behind <= to_call or other_behind == 0:
+                return node
+
+            # A bet or raise has to be at least as large as the previous one
+            pot_after_call = contribution[0] + contribution[1] + to_call
+            sizes = self.raise_sizes if to_call > 0 else self.bet_sizes
+            amounts = {min(to_call + max(int(round(f * pot_after_call)), to_call, 1), behind) for f in sizes}
+            if self.all_in:
+                amounts.add(behind)
+
+            for amount in sorted(amounts):
+                raised = list(contribution)
+                raised[player] += amount
+                label = '{}{}'.format('r' if to_call > 0 else 'b', raised[player] - half)
+                branch(node, label, decision(raised, other, raises + 1, True, history + label + '-'))
+
+            return node
+
+        decision([half, half], 0, 0, False, '')
+
+        self.kind = np.array(kinds, dtype=np.int8)
+        self.player = np.array(players, dtype=np.int8)
+        self.contributions = np.array(contributions, dtype=np.int64)
+        self.actions = actions
+        self.histories = histories
+
+        width = max(len(c) for c in children)
+        self.children = np.full((len(kinds), width), -1, dtype=np.int64)
+        for node, c in enumerate(children):
+            self.children[node, :len(c)] = c
+
+        self.decision_nodes = np.flatnonzero(self.kind == DECISION)
+        self.decision_index = np.full(len(kinds), -1, dtype=np.int64)
+        self.decision_index[self.decision_nodes] = np.arange(len(self.decision_nodes))
+
+    def _compatible_weight(self, reach):
+        """Opponent weight that shares no card with each holding"""
+
+        per_card = np.bincount(COMBOS[:, 0], weights=reach, minlength=52)
+        per_card += np.bincount(COMBOS[:, 1], weights=reach, minlength=52)
+
+        return reach.sum() - per_card[COMBOS[:, 0]] - per_card[COMBOS[:, 1]] + reach
+
+    def _terminal_values(self, node, traverser, reach_other):
+        """Counterfactual values of the traverser's holdings at a fold or showdown"""
+
+        if self.kind[node] == FOLD_NODE:
+            folder = self.player[node]
+            amount = self.contributions[node, folder]
+            sign = -1 if folder == traverser else 1
+            return sign * amount * self._compatible_weight(reach=reach_other) * self.valid
+
+        return self.contributions[node, 0] * self.showdown_values(reach=reach_other)
+
+    def _current_strategy(self, d, k):
+        """Regret-matching strategy of a decision node over its k actions"""
+
+        positive = self.regrets[d, :, :k]
+        totals = positive.sum(axis=1, keepdims=True)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(totals > 0, positive / totals, 1 / k)
+
+    def _cfr(self, node, traverser, reach_own, reach_other):
+        """One CFR+ pass below a node, updating the traverser's regrets
+
+        Returns:
+            (1326,) counterfactual values of the traverser's holdings
+        """
+
+        if self.kind[node] != DECISION:
+            return self._terminal_values(node=node, traverser=traverser, reach_other=reach_other)
+
+        d = self.decision_index[node]
+        k = len(self.actions[node])
+        strategy = self._current_strategy(d=d, k=k)
+        children = self.children[node, :k]
+
+        if self.player[node] != traverser:
+            values = np.zeros(len(COMBOS))
+            for j, child in enumerate(children):
+                values += self._cfr(child, traverser, reach_own, reach_other * strategy[:, j])
+            return values
+
+        action_values = np.empty((len(COMBOS), k))
+        for j, child in enumerate(children):
+            action_values[:, j] = self._cfr(child, traverser, reach_own * strategy[:, j], reach_other)
+
+        values = (strategy * action_values).sum(axis=1)
+
+        regrets = self.regrets[d, :, :k]
+        regrets += action_values - values[:, None]
+        np.maximum(regrets, 0, out=regrets)
+        self.strategy_sum[d, :, :k] += self.iteration * reach_own[:, None] * strategy
+
+        return values
+
+    def _best_response(self, node, traverser, reach_other):
+        """Values of the traverser's best response to the other player's average strategy"""
+
+        if self.kind[node] != DECISION:
+            return self._terminal_values(node=node, traverser=traverser, reach_other=reach_other)
+
+        children = self.children[node, :len(self.actions[node])]
+
+        if self.player[node] != traverser:
+            strategy = self.average_strategy(node=node)
+            values = np.zeros(len(COMBOS))
+            for j, child in enumerate(children):
+                values += self._best_response(child, traverser, reach_other * strategy[:, j])
+            return values
+
+        return np.max([self._best_response(child, traverser, reach_other) for child in children], axis=0)
@@ -0,0 +1,125 @@
+import pytest
+
+from game_utils.betting import ALL_IN, CALL, CALL_BIT, FOLD, FOLD_BIT, RAISE, RAISE_BIT, BettingStateMachine
+
+
+def three_handed(stacks=(100, 100, 100)):
+    # Seat 0 has the button, seats 1 and 2 post blinds of 1 and 2
+    table = BettingStateMachine(n_players=3)
+    table.start_hand(stacks=list(stacks), button=0, small_blind_position=1, big_blind_position=2,
+                     small_blind=1, big_blind=2)
+    return table
+
+
+def limp_to_flop(table):
+    table.apply(CALL)
+    table.apply(CALL)
+    table.apply(CALL)
+    table.next_street()
+
+
+def test_big_blind_gets_the_option():
+    table = three_handed()
+
+    assert table.to_act == 0
+    assert table.apply(CALL) == 2
+    assert table.apply(CALL) == 1
+    assert not table.street_closed
+    assert table.to_act == 2
+    assert table.legal_actions() == CALL_BIT | RAISE_BIT
+
+    table.apply(CALL)
+    assert table.street_closed and not table.hand_over
+
+
+def test_checked_around_street_closes_and_the_next_starts_left_of_the_button():
+    table = three_handed()
+    limp_to_flop(table)
+
+    assert table.street == 1 and table.to_act == 1
+    assert table.legal_actions() == CALL_BIT | RAISE_BIT
+    for seat in (1, 2, 0):
+        assert table.to_act == seat
+        table.apply(CALL)
+
+    assert table.street_closed
+
+
+def test_a_bet_has_to_be_answered_by_everyone():
+    table = three_handed()
+    limp_to_flop(table)
+
+    table.apply(CALL)
+    table.apply(RAISE, 6)
+    assert table.legal_actions() == FOLD_BIT | CALL_BIT | RAISE_BIT
+    table.apply(CALL)
+    assert not table.street_closed and table.to_act == 1
+
+    table.apply(CALL)
+    assert table.street_closed
+    assert table.total_bets == [8, 8, 8]
+
+
+def test_hand_ends_when_everybody_folds():
+    table = three_handed()
+    table.apply(FOLD)
+    table.apply(FOLD)
+
+    assert table.street_closed and table.hand_over
+
+
+def test_river_closing_ends_the_hand():
+    table = three_handed()
+    limp_to_flop(table)
+    for _ in range(2):
+        for _ in range(3):
+            table.apply(CALL)
+        table.next_street()
+    for _ in range(3):
+        table.apply(CALL)
+
+    assert table.street == 3 and table.hand_over
+
+
+def test_short_all_in_raise_does_not_reopen_the_betting():
+    table = three_handed(stacks=(100, 100, 13))
+    limp_to_flop(table)
+
+    table.apply(RAISE, 10)
+    assert table.min_raise_to() == 11 == table.max_raise_to()
+    table.apply(RAISE, 11)
+    assert table.status[2] == ALL_IN
+
+    # The button has not acted yet, so it may still raise
+    assert table.legal_actions() == FOLD_BIT | CALL_BIT | RAISE_BIT
+    table.apply(CALL)
+
+    # The original bettor only faces an incomplete raise
+    assert table.to_act == 1
+    assert table.legal_actions() == FOLD_BIT | CALL_BIT
+    assert table.apply(CALL) == 1
+    assert table.street_closed
+
+
+def test_full_raise_reopens_the_betting():
+    table = three_handed()
+    limp_to_flop(table)
+
+    table.apply(RAISE, 10)
+    table.apply(RAISE, 20)
+    table.apply(CALL)
+
+    assert table.to_act == 1
+    assert table.legal_actions() == FOLD_BIT | CALL_BIT | RAISE_BIT
+
+
+def test_illegal_actions_are_rejected():
+    table = three_handed()
+    limp_to_flop(table)
+
+    with pytest.raises(ValueError):
+        table.apply(FOLD)
+    with pytest.raises(ValueError):
+        table.apply(RAISE, 1)
+    with pytest.raises(ValueError):
+        table.next_street()
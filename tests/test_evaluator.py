@@ -0,0 +1,72 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from card_utils.cards import parse_cards
+from interpreter.evaluator import HandEvaluator
+
+# Distinct 5-card hands and 5-card deals of every category, high card first
+DISTINCT_HANDS = [1277, 2860, 858, 858, 10, 1277, 156, 156, 10]
+DEALS = [1302540, 1098240, 123552, 54912, 10200, 5108, 3744, 624, 40]
+
+
+@pytest.fixture(scope='module')
+def five_card_ranks():
+    cards = np.array(list(combinations(range(52), 5)), dtype=np.int64)
+    return HandEvaluator().evaluate_masks(np.bitwise_or.reduce(np.int64(1) << cards, axis=1))
+
+
+def test_five_card_ranks_are_dense(five_card_ranks):
+    distinct = np.unique(five_card_ranks)
+
+    assert len(distinct) == 7462
+    assert distinct[0] == 1 and distinct[-1] == 7462
+
+
+def test_category_counts(five_card_ranks):
+    evaluator = HandEvaluator()
+    categories = evaluator.rank_category[five_card_ranks]
+
+    assert np.bincount(evaluator.rank_category[np.unique(five_card_ranks)], minlength=9).tolist() == DISTINCT_HANDS
+    assert np.bincount(categories, minlength=9).tolist() == DEALS
+
+
+def test_seven_cards_play_the_best_five():
+    evaluator = HandEvaluator()
+    rng = np.random.default_rng(0)
+
+    for _ in range(200):
+        cards = rng.choice(52, size=7, replace=False).tolist()
+        best = max(evaluator.evaluate(five) for five in combinations(cards, 5))
+
+        assert evaluator.evaluate(cards) == best
+        assert evaluator.evaluate_batch(np.array([cards]))[0] == best
+
+
+@pytest.mark.parametrize('hand, name', [
+    ('AsKsQsJsTs2d3c', 'straight flush'),
+    ('As2d3c4h5s9dJc', 'straight'),
+    ('AhAdKsKdKc2s3s', 'full house'),
+    ('2h3h4h5h7h7c7d', 'flush'),
+])
+def test_hand_types(hand, name):
+    evaluator = HandEvaluator()
+
+    assert evaluator.hand_type(evaluator.evaluate(parse_cards(hand))) == name
+
+
+def test_wheel_is_the_lowest_straight():
+    evaluator = HandEvaluator()
+
+    assert evaluator.evaluate(parse_cards('As2d3c4h5s')) < evaluator.evaluate(parse_cards('2s3d4c5h6s'))
+
+
+@pytest.mark.parametrize('hand', ['AsKd', 'AsKdQhJc', 'AsKdQhJcTs9s8s7s'])
+def test_wrong_card_counts_are_rejected(hand):
+    mask = sum(1 << c for c in parse_cards(hand))
+
+    with pytest.raises(ValueError):
+        HandEvaluator().evaluate_masks(np.array([mask], dtype=np.int64))
+    with pytest.raises(ValueError):
+        HandEvaluator().evaluate_mask(mask)
@@ -0,0 +1,32 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from card_utils.cards import parse_cards
+from equity_utils.potential import hand_potential
+
+
+def test_blocked_runouts_are_left_out_of_ehs2():
+    # Every runout with a queen of hearts or clubs blocks the whole range
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        result = hand_potential(parse_cards('AsKd'), parse_cards('2s7h9d'), opponent_range='QhQc')
+
+    assert np.isfinite(result['ehs2'])
+    for key in ('hs', 'ppot', 'npot', 'ehs', 'ehs2'):
+        assert 0 <= result[key] <= 1
+
+
+def test_narrow_range_one_card_lookahead():
+    result = hand_potential(parse_cards('AsKd'), parse_cards('2s7h9dJc'), opponent_range='QhQc', lookahead=1)
+
+    # Behind to a pair, ace-king only improves by pairing: 6 of the 44 rivers that leave the queens live
+    assert result['hs'] == 0
+    assert result['ppot'] == pytest.approx(6 / 44)
+    assert result['ehs2'] == pytest.approx(6 / 44)
+
+
+def test_empty_range_is_rejected():
+    with pytest.raises(ValueError):
+        hand_potential(parse_cards('AsKd'), parse_cards('2s7h9d'), opponent_range='AhAs')
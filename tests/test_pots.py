@@ -0,0 +1,49 @@
+import pytest
+
+from game_utils.pots import PotLedger
+
+
+def ledger(contributions, folded=()):
+    pots = PotLedger(n_players=len(contributions))
+    for seat, amount in enumerate(contributions):
+        pots.add(seat, amount)
+    for seat in folded:
+        pots.fold(seat)
+    return pots
+
+
+def test_single_pot():
+    assert ledger([10, 10, 10]).build_pots() == [(30, [0, 1, 2])]
+
+
+def test_side_pots():
+    pots = ledger([100, 50, 200])
+
+    assert pots.build_pots() == [(150, [0, 1, 2]), (100, [0, 2]), (100, [2])]
+    assert pots.total == 350
+
+
+def test_folded_over_contribution_goes_to_the_last_pot():
+    pots = ledger([100, 40, 40], folded=[0])
+
+    assert pots.build_pots() == [(180, [1, 2])]
+
+
+def test_folded_seat_below_an_all_in():
+    pots = ledger([20, 50, 100, 100], folded=[0])
+
+    assert pots.build_pots() == [(170, [1, 2, 3]), (100, [2, 3])]
+
+
+def test_short_all_in_wins_only_the_main_pot():
+    # Seat 1 has the best hand, seat 0 the second best
+    assert ledger([100, 50, 200]).award(showdown_ranks=[1, 0, 2]) == [100, 150, 100]
+
+
+def test_folded_seats_never_win():
+    assert ledger([100, 40, 40], folded=[0]).award(showdown_ranks=[0, 1, 1]) == [0, 90, 90]
+
+
+@pytest.mark.parametrize('button, payouts', [(0, [0, 8, 7]), (1, [0, 7, 8]), (2, [0, 8, 7])])
+def test_odd_chips_go_left_of_the_button(button, payouts):
+    assert ledger([5, 5, 5]).award(showdown_ranks=[1, 0, 0], button=button) == payouts